@@ -0,0 +1,59 @@
+"""
+batches.py — Incremental processing of Arrow record batches.
+
+Query results streamed as Arrow batches (e.g. a Snowflake cursor's
+fetch_arrow_batches()) are folded into grouped sums one batch at a time,
+so peak memory follows the aggregate rather than the full result set.
+Partial aggregates are buffered and merged into the running aggregate in
+bulk, so each group is re-aggregated a bounded number of times however
+many batches arrive.
+"""
+
+import pyarrow as pa
+
+# Partial aggregates are buffered until they hold this many times the
+# running aggregate's rows, then merged into it in one group_by
+MERGE_FACTOR = 2
+
+
+def lower_columns(table: pa.Table) -> pa.Table:
+    """Lower-case column names (Snowflake returns them upper-case)."""
+    return table.rename_columns([c.lower() for c in table.column_names])
+
+
+def group_sum(table: pa.Table, by, sums) -> pa.Table:
+    """Sum `sums` per `by`, keeping the column names and order `by + sums`."""
+    by, sums = list(by), list(sums)
+    out = table.group_by(by, use_threads=False).aggregate([(c, "sum") for c in sums])
+    names = [c[: -len("_sum")] if c.endswith("_sum") else c for c in out.column_names]
+    return out.rename_columns(names).select(by + sums)
+
+
+def _merge(acc, parts, by, sums) -> pa.Table:
+    tables = ([acc] if acc is not None else []) + parts
+    if len(tables) == 1:
+        return tables[0]
+    # Per-batch integer widths can differ, so let the schemas widen
+    return group_sum(pa.concat_tables(tables, promote_options="permissive"), by, sums)
+
+
+def fold_batches(batches, by, sums) -> pa.Table:
+    """
+    Fold an iterable of Arrow tables/batches into one table of sums of
+    `sums` per `by`. Only the running aggregate, the buffered partial
+    aggregates (at most MERGE_FACTOR times its size) and one batch are held.
+    """
+    acc, buffer, buffered = None, [], 0
+    for batch in batches:
+        if isinstance(batch, pa.RecordBatch):
+            batch = pa.Table.from_batches([batch])
+        part = group_sum(batch, by, sums)
+        buffer.append(part)
+        buffered += part.num_rows
+        if acc is None or buffered > MERGE_FACTOR * acc.num_rows:
+            acc, buffer, buffered = _merge(acc, buffer, by, sums), [], 0
+    if buffer:
+        acc = _merge(acc, buffer, by, sums)
+    if acc is None:
+        return pa.table({c: pa.array([], pa.null()) for c in list(by) + list(sums)})
+    return acc
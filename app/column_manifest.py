@@ -0,0 +1,68 @@
+"""
+column_manifest.py — Which columns each dashboard section reads, per dataset.
+
+Loaders build explicit SELECT lists from this manifest instead of fetching
+every column of a view. When a chart starts reading a new column, add it
+here; anything not listed is never transferred.
+"""
+
+# Dashboard section -> dataset -> columns read there
+REQUIREMENTS = {
+    "sidebar": {
+        "unified": ["date", "platform", "campaign_name"],
+    },
+    "executive_overview": {
+        # KPI cards, spend donut, conversions bar
+        "unified": ["date", "platform", "campaign_name", "impressions", "clicks", "spend", "conversions"],
+        # Daily spend / conversions lines
+        "daily": ["date", "platform", "total_spend", "total_conversions"],
+    },
+    "platform_deep_dive": {
+        "plat_summary": [
+            "platform", "campaigns", "total_impressions", "total_clicks", "total_spend",
+            "total_conversions", "avg_ctr", "avg_cpc", "avg_cpa", "avg_conversion_rate",
+            "avg_cpm", "spend_share", "conversion_share",
+        ],
+        "daily": ["date", "platform", "avg_cpa"],
+        "weekly": ["week_start", "platform", "spend"],
+        "tt_funnel": ["campaign_name", "total_views", "watched_25pct", "watched_50pct", "watched_75pct", "watched_100pct"],
+        "gq": ["campaign_name", "ad_group_name", "avg_quality_score", "avg_cpa", "total_cost"],
+    },
+    "campaign_analysis": {
+        "camp_perf": [
+            "platform", "campaign_name", "total_spend", "total_impressions", "total_clicks",
+            "total_conversions", "avg_ctr", "avg_cpc", "avg_cpa", "avg_conversion_rate",
+            "spend_rank", "cpa_rank",
+        ],
+    },
+    "insights": {
+        # Also covers app/insights.py, which reads the WoW columns
+        "plat_summary": [
+            "platform", "total_impressions", "total_spend", "avg_ctr", "avg_cpc", "avg_cpa",
+            "avg_conversion_rate", "avg_cpm", "spend_share", "conversion_share",
+        ],
+        "camp_perf": [
+            "platform", "campaign_name", "total_spend", "total_conversions", "avg_ctr",
+            "avg_cpa", "avg_conversion_rate",
+        ],
+        "weekly": ["week_start", "platform", "spend", "spend_wow_change", "conversions_wow_change"],
+    },
+}
+
+
+def required_columns(dataset: str, sections=None, extra=()) -> list:
+    """
+    Ordered union of the columns `sections` (default: all) read from `dataset`,
+    plus `extra` (e.g. upsert keys the UI never shows).
+    """
+    cols = []
+    for section, datasets in REQUIREMENTS.items():
+        if sections is None or section in sections:
+            cols += datasets.get(dataset, [])
+    cols += list(extra)
+    return list(dict.fromkeys(cols))
+
+
+def select_sql(view: str, dataset: str, sections=None, extra=()) -> str:
+    """SELECT statement fetching only the required columns of `view`."""
+    return f"SELECT {', '.join(required_columns(dataset, sections, extra))} FROM {view}"
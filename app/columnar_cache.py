@@ -0,0 +1,179 @@
+"""
+columnar_cache.py — Persistent Arrow IPC cache for frames derived from CSV exports.
+
+A cached frame is keyed on the size, mtime and content hash of every source
+file and is only rebuilt when one of them changes. A cache hit maps the file
+instead of re-parsing the CSVs, but is not zero-copy: converting it to pandas
+copies the categorical and nullable (Int64/Float64) columns into new
+buffers, and only non-null NumPy columns (float32 KPIs, dates) stay views of
+the map. For 1M unified rows (161 MB file) a hit costs about 0.15 s, most
+of it that conversion, against 2.9 s to parse the CSVs.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+FORMAT_VERSION = 1
+_HASH_CHUNK = 8 * 1024 * 1024
+
+
+def _content_hash(path: Path, mark: int = None):
+    """
+    Hash `path`; also return the digest of its first `mark` bytes (or None),
+    computed in the same pass.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    at_mark = None
+    with open(path, "rb") as f:
+        if mark is not None:
+            prefix = f.read(mark)
+            h.update(prefix)
+            at_mark = h.copy().hexdigest()
+            # Only a cut at a line boundary counts as an append
+            nxt = f.read(1)
+            h.update(nxt)
+            if not (prefix.endswith(b"\n") or nxt in (b"\n", b"\r")):
+                at_mark = None
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest(), at_mark
+
+
+def _fingerprint(paths, previous: dict = None):
+    previous = previous or {}
+    fp, appended = {}, {}
+    for p in paths:
+        p = Path(p)
+        st_ = p.stat()
+        old = previous.get(p.name)
+        if old and old["size"] == st_.st_size and old["mtime_ns"] == st_.st_mtime_ns:
+            sha = old["sha"]
+        else:
+            grew = old is not None and st_.st_size > old["size"]
+            sha, prefix_sha = _content_hash(p, old["size"] if grew else None)
+            if grew and prefix_sha == old["sha"]:
+                appended[p.name] = old["size"]
+        fp[p.name] = {"size": st_.st_size, "mtime_ns": st_.st_mtime_ns, "sha": sha}
+    return fp, appended
+
+
+def source_fingerprint(paths, previous: dict = None) -> dict:
+    """
+    Return {file name: {size, mtime_ns, sha}} for each source path.
+
+    A file whose size and mtime match `previous` reuses the recorded hash,
+    so an unchanged tree costs one stat() per file rather than a full read.
+    """
+    return _fingerprint(paths, previous)[0]
+
+
+def cache_key(fp: dict, version: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{FORMAT_VERSION}:{version}".encode())
+    for name in sorted(fp):
+        h.update(name.encode())
+        h.update(fp[name]["sha"].encode())
+    return h.hexdigest()
+
+
+def read_manifest(path: Path) -> dict:
+    """The JSON object in `path`, or {} if it is missing or unreadable."""
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_atomic(path: Path, write) -> None:
+    """
+    Call `write(tmp)` on a temporary sibling of `path`, then rename it over
+    `path`, so readers see the old file or the new one, never a partial one.
+    """
+    # Unique per writer, so concurrent writers of one path never share a temp file
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}-{threading.get_ident()}")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def read_frame(path: Path) -> pd.DataFrame:
+    """
+    Read an Arrow IPC file through a memory map and return it as a
+    DataFrame. Categorical and nullable columns are copied out of the map
+    (see the module docstring); plain NumPy columns are views of it.
+    """
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def write_frame(df: pd.DataFrame, path: Path) -> None:
+    """Write `df` as an uncompressed Arrow IPC file (mmap-friendly)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def _write(tmp):
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    write_atomic(path, _write)
+
+
+def cached_frame(name: str, sources, build, cache_dir: Path, version: str = "", update=None) -> pd.DataFrame:
+    """
+    Return the frame produced by `build()` for `sources`, via the on-disk cache.
+
+    `version` identifies the shape `build()` produces (e.g. a schema digest)
+    and is part of the cache key alongside the source fingerprints.
+
+    On a miss the frame is built, written, and then served from the written
+    file as well, so hits and misses hand back identical frames.
+
+    If every changed source only had rows appended since the cached build,
+    `update(previous_frame, {file name: byte offset})` is tried first; it
+    should merge just the appended rows and may return None to force a
+    full `build()`.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = cache_dir / f"{name}.manifest.json"
+    manifest = read_manifest(manifest_path)
+
+    old_fp = manifest.get("sources") or {}
+    fp, appended = _fingerprint(sources, old_fp)
+    key = cache_key(fp, version)
+    data_path = cache_dir / f"{name}-{key}.arrow"
+
+    if manifest.get("key") == key and data_path.exists():
+        if manifest.get("sources") != fp:
+            # Touched but unchanged files: refresh stat info, keep the data.
+            manifest["sources"] = fp
+            write_atomic(manifest_path, lambda t: t.write_text(json.dumps(manifest)))
+        return read_frame(data_path)
+
+    frame = None
+    old_path = cache_dir / f"{name}-{manifest.get('key')}.arrow"
+    changed = {n for n in fp if old_fp.get(n, {}).get("sha") != fp[n]["sha"]}
+    if (
+        update is not None
+        and manifest.get("tag") == version
+        and old_path.exists()
+        and changed
+        and changed <= set(appended)
+    ):
+        frame = update(read_frame(old_path), {n: appended[n] for n in changed})
+    if frame is None:
+        frame = build()
+
+    write_frame(frame, data_path)
+    manifest = {"version": FORMAT_VERSION, "tag": version, "key": key, "sources": fp}
+    write_atomic(manifest_path, lambda t: t.write_text(json.dumps(manifest)))
+    for stale in cache_dir.glob(f"{name}-*.arrow"):
+        if stale != data_path:
+            stale.unlink(missing_ok=True)
+    return read_frame(data_path)
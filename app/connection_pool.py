@@ -0,0 +1,115 @@
+"""
+connection_pool.py — Bounded pool of database connections shared by sessions.
+
+At most `max_size` connections exist at once; a checkout waits for a free
+slot instead of queueing every viewer's queries on a single connection.
+Each checkout verifies the connection is still alive and transparently
+replaces one that was dropped, so a lost connection heals on the next
+query instead of failing until the app restarts. benchmarks/pool_load.py
+load-tests it against a fake connector.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_MAX_SIZE = 4
+
+# Idle time after which a checkout pings the connection before handing it out
+VALIDATE_AFTER_S = 60.0
+
+
+def _ping(conn) -> bool:
+    """Default liveness check: the connector's own flag, then a round trip."""
+    if getattr(conn, "is_closed", lambda: False)():
+        return False
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1")
+        cur.fetchall()
+    finally:
+        cur.close()
+    return True
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def create_pool(connect, max_size: int = DEFAULT_MAX_SIZE, is_alive=_ping, validate_after_s: float = VALIDATE_AFTER_S) -> dict:
+    """
+    Return a pool opening connections with `connect()` on demand, up to
+    `max_size` at a time. `is_alive(conn)` may return False or raise for a
+    dead connection; it runs on checkout once a connection has been idle
+    for `validate_after_s` seconds (0 checks on every checkout).
+    """
+    if max_size < 1:
+        raise ValueError("max_size must be at least 1")
+    return {
+        "connect": connect,
+        "is_alive": is_alive,
+        "validate_after_s": validate_after_s,
+        "max_size": max_size,
+        "slots": threading.BoundedSemaphore(max_size),
+        "lock": threading.Lock(),
+        "idle": deque(),  # (conn, last returned at)
+        "stats": {"opened": 0, "reconnects": 0},
+    }
+
+
+def _alive(pool: dict, conn, idle_since: float) -> bool:
+    if time.monotonic() - idle_since < pool["validate_after_s"]:
+        return not getattr(conn, "is_closed", lambda: False)()
+    try:
+        return bool(pool["is_alive"](conn))
+    except Exception:
+        return False
+
+
+def _acquire(pool: dict):
+    while True:
+        with pool["lock"]:
+            if not pool["idle"]:
+                break
+            conn, idle_since = pool["idle"].pop()
+        if _alive(pool, conn, idle_since):
+            return conn
+        _close(conn)
+        with pool["lock"]:
+            pool["stats"]["reconnects"] += 1
+    conn = pool["connect"]()
+    with pool["lock"]:
+        pool["stats"]["opened"] += 1
+    return conn
+
+
+@contextmanager
+def connection(pool: dict, timeout: float = None):
+    """
+    Check a live connection out of `pool` for the duration of the block.
+
+    Blocks while `max_size` connections are checked out (raising
+    TimeoutError after `timeout` seconds). A connection found dead after
+    the block raised is discarded rather than returned to the pool.
+    """
+    if not pool["slots"].acquire(timeout=timeout):
+        raise TimeoutError(f"no connection free within {timeout}s (max_size={pool['max_size']})")
+    conn = None
+    try:
+        conn = _acquire(pool)
+        yield conn
+    except Exception:
+        if conn is not None and not _alive(pool, conn, float("-inf")):
+            _close(conn)
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            with pool["lock"]:
+                pool["idle"].append((conn, time.monotonic()))
+        pool["slots"].release()
+
@@ -1,62 +1,443 @@
 """
 data_loader.py — Data access layer for Streamlit in Snowflake (SiS).
 Uses the active Snowpark session to query ANALYTICS views.
+
+All views can be fetched in one batch: every query is submitted as a
+Snowpark async job before any result is awaited, so a page load costs the
+slowest query rather than the sum of all of them. Queries select only the
+columns the dashboard reads (see column_manifest.py).
+
+For large accounts the sidebar filters can instead be pushed down: they
+become parameterized WHERE clauses and the warehouse returns aggregates
+only, cached per normalized filter key (see pushdown.py).
+
+Query results are cached process-wide as Arrow IPC bytes (result_cache.py)
+rather than through st.cache_data's pickling, so caching works in SiS and a
+rerun that only changes a download-mode filter issues no query. Results are
+keyed on the RAW tables' version (freshness.py), probed at most every
+PROBE_INTERVAL_S, so they are refetched when a load changed the data and
+never otherwise. The probe and that refetch run on a background thread
+while the cached results of the previous version keep being served; the
+new version is swapped in once the datasets and the most recently used
+pushdown results have been reloaded for it, so after warm-up no rerun
+waits on the warehouse unless it picks a filter not used lately. Every
+session is handed the same cached frames and indexes, read-only, rather
+than copies. With use_disk_tier() the results are also kept in a
+directory, so a restarted app or a new replica only probes the version
+and reads them back.
 """
 
+import threading
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
-from snowflake.snowpark.context import get_active_session
 
-_session = get_active_session()
+from column_manifest import select_sql
+from columnar_cache import cache_key, source_fingerprint
+from date_slice import sort_by_date
+from filter_index import build_index
+from frame_store import freeze
+import freshness
+from incremental import UNIFIED_KEYS, cutoffs, dedupe, since_clause, upsert, watermarks
+from prefix_sums import build_prefix_sums
+from pushdown import applied_key, where_clause
+import result_cache
+from schema import UNIFIED_ADS, enforce_schema, subset
 
+try:
+    from snowflake.snowpark.context import get_active_session
 
-@st.cache_data(ttl=600)
-def load_unified_ads():
-    df = _session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS").to_pandas()
+    _default_session = get_active_session()
+except Exception:  # outside SiS: callers pass a session (see local_warehouse.py)
+    _default_session = None
+
+# Days behind each platform's watermark that are re-pulled on every refresh,
+# so late restatements replace the rows loaded earlier
+RESTATEMENT_DAYS = 3
+
+# UNIFIED_ADS row count from which the dashboard filters in the warehouse
+# instead of downloading the whole table
+PUSHDOWN_MIN_ROWS = 1_000_000
+
+# Arrow bytes the result cache may hold (in memory, and in its optional
+# directory), and seconds between freshness probes
+RESULT_CACHE_BYTES = 512 * 1024 * 1024
+RESULT_DISK_BYTES = 2 * 1024 * 1024 * 1024
+PROBE_INTERVAL_S = freshness.PROBE_INTERVAL_S
+
+# Pushdown results refetched ahead of a data change, most recently used
+# first; each is one warehouse query
+RELOAD_FILTERED = 20
+
+
+def _lower(df):
     df.columns = [c.lower() for c in df.columns]
-    df["date"] = pd.to_datetime(df["date"])
     return df
 
 
-@st.cache_data(ttl=600)
-def load_daily_summary():
-    df = _session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.DAILY_PLATFORM_SUMMARY").to_pandas()
-    df.columns = [c.lower() for c in df.columns]
+def _prepare_unified(df):
+    df = _lower(df)
+    return enforce_schema(df, subset(UNIFIED_ADS, df.columns))
+
+
+def _prepare_daily(df):
+    df = _lower(df)
     df["date"] = pd.to_datetime(df["date"])
     return df
 
 
-@st.cache_data(ttl=600)
-def load_campaign_performance():
-    df = _session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.CAMPAIGN_PERFORMANCE").to_pandas()
-    df.columns = [c.lower() for c in df.columns]
+def _prepare_weekly(df):
+    df = _lower(df)
+    df["week_start"] = pd.to_datetime(df["week_start"])
     return df
 
 
-@st.cache_data(ttl=600)
-def load_platform_summary():
-    df = _session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.PLATFORM_SUMMARY").to_pandas()
-    df.columns = [c.lower() for c in df.columns]
+def _prepare_dimensions(df):
+    df = _lower(df)
+    df["min_date"] = pd.to_datetime(df["min_date"])
+    df["max_date"] = pd.to_datetime(df["max_date"])
+    df["row_count"] = pd.to_numeric(df["row_count"])
     return df
 
 
-@st.cache_data(ttl=600)
-def load_weekly_trends():
-    df = _session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.WEEKLY_TRENDS").to_pandas()
-    df.columns = [c.lower() for c in df.columns]
-    df["week_start"] = pd.to_datetime(df["week_start"])
+def _prepare_totals(df):
+    df = _lower(df)
+    for col in df.columns.drop("platform"):
+        df[col] = pd.to_numeric(df[col])
     return df
 
 
-@st.cache_data(ttl=600)
+# Dataset name -> view, post-processing, and (for date-partitioned views) the
+# upsert key, watermark column and restatement window of incremental refreshes
+DATASETS = {
+    "unified": {
+        "view": "IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS",
+        "prepare": _prepare_unified,
+        "keys": UNIFIED_KEYS,
+        "date_col": "date",
+        "lookback_days": RESTATEMENT_DAYS,
+    },
+    "daily": {
+        "view": "IMPROVADO_ADS.ANALYTICS.DAILY_PLATFORM_SUMMARY",
+        "prepare": _prepare_daily,
+        "keys": ["date", "platform"],
+        "date_col": "date",
+        "lookback_days": RESTATEMENT_DAYS,
+    },
+    "camp_perf": {
+        "view": "IMPROVADO_ADS.ANALYTICS.CAMPAIGN_PERFORMANCE",
+        "prepare": _lower,
+    },
+    "plat_summary": {
+        "view": "IMPROVADO_ADS.ANALYTICS.PLATFORM_SUMMARY",
+        "prepare": _lower,
+    },
+    "weekly": {
+        "view": "IMPROVADO_ADS.ANALYTICS.WEEKLY_TRENDS",
+        "prepare": _prepare_weekly,
+        "keys": ["week_start", "platform"],
+        "date_col": "week_start",
+        # A restated day moves its week's total and the next week's WoW change
+        "lookback_days": RESTATEMENT_DAYS + 7,
+    },
+    "tt_funnel": {
+        "view": "IMPROVADO_ADS.ANALYTICS.TIKTOK_VIDEO_FUNNEL",
+        "prepare": _lower,
+    },
+    "gq": {
+        "view": "IMPROVADO_ADS.ANALYTICS.GOOGLE_QUALITY_ANALYSIS",
+        "prepare": _lower,
+    },
+}
+
+
+# Filter-dependent datasets computed in the warehouse: SQL with a {where}
+# placeholder, and the view column each sidebar filter applies to
+FILTERED = {
+    "plat_agg": {
+        "sql": (
+            "SELECT platform, COUNT(*) AS row_count, SUM(impressions) AS total_impressions, "
+            "SUM(clicks) AS total_clicks, SUM(spend) AS total_spend, "
+            "SUM(conversions) AS total_conversions "
+            "FROM IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS WHERE {where} "
+            "GROUP BY platform ORDER BY platform"
+        ),
+        "columns": {"date": "date", "platform": "platform", "campaign": "campaign_name"},
+        "prepare": _prepare_totals,
+    },
+    "daily": {
+        "sql": select_sql(DATASETS["daily"]["view"], "daily") + " WHERE {where} ORDER BY date, platform",
+        "columns": {"date": "date", "platform": "platform"},
+        "prepare": _prepare_daily,
+    },
+    "camp_perf": {
+        "sql": select_sql(DATASETS["camp_perf"]["view"], "camp_perf") + " WHERE {where} ORDER BY total_spend DESC",
+        "columns": {"platform": "platform", "campaign": "campaign_name"},
+        "prepare": _lower,
+    },
+    "plat_summary": {
+        "sql": select_sql(DATASETS["plat_summary"]["view"], "plat_summary") + " WHERE {where} ORDER BY total_spend DESC",
+        "columns": {"platform": "platform"},
+        "prepare": _lower,
+    },
+    "weekly": {
+        "sql": select_sql(DATASETS["weekly"]["view"], "weekly") + " WHERE {where} ORDER BY week_start, platform",
+        "columns": {"platform": "platform"},
+        "prepare": _prepare_weekly,
+    },
+}
+
+
+@st.cache_resource
+def _result_cache():
+    """Process-wide Arrow IPC cache of query results (see result_cache.py)."""
+    return result_cache.create_cache(max_bytes=RESULT_CACHE_BYTES, ttl_s=None)
+
+
+def use_disk_tier(path, max_bytes: int = RESULT_DISK_BYTES):
+    """
+    Keep query results under `path` as well as in memory (see
+    result_cache.attach_disk), so they outlive the process. Files written
+    by other versions of the app's code are discarded. Call before the
+    first load; later calls are no-ops.
+    """
+    cache = _result_cache()
+    if cache["disk"] is None:
+        code = source_fingerprint(sorted(Path(__file__).parent.glob("*.py")))
+        result_cache.attach_disk(cache, path, max_bytes, tag=cache_key(code, "data_loader"))
+
+
+def _reload(old: str, new: str, session):
+    """
+    Refetch, for version `new`, the datasets and dimensions cached for
+    `old` (which is still served meanwhile) and its RELOAD_FILTERED most
+    recently used pushdown results, then drop what is older than `old`.
+    Other pushdown results are refetched when next selected.
+    """
+    cache = _result_cache()
+    with cache["lock"]:
+        keys = [k for k in cache["entries"] if k[-1] == old]  # least recently used first
+    datasets = [k[1] for k in keys if k[0] == "dataset"]
+    if datasets:
+        load_batch(datasets, session=session, version=new)
+    if ("dimensions", old) in keys:
+        load_dimensions(session, version=new)
+    recent = [(k[2], k[1]) for k in keys if k[0] == "filtered"][-RELOAD_FILTERED:]
+    if recent:
+        _fetch_filtered(recent, session, new)
+    result_cache.invalidate(cache, lambda key: key[-1] not in (old, new))
+
+
+@st.cache_resource
+def _freshness_probe():
+    """Process-wide probe of the RAW tables' version, refreshed in the background."""
+    return freshness.create_probe(freshness.warehouse_version, PROBE_INTERVAL_S, on_change=_reload, background=True)
+
+
+def data_version(session=None) -> str:
+    """
+    Version token of the RAW tables, probed through `session` (default: the
+    active Snowpark session) at most every PROBE_INTERVAL_S. Only the first
+    call waits for the probe; later ones get the current version while a
+    due re-probe (and reload) runs in the background.
+    """
+    return freshness.current_version(_freshness_probe(), session or _default_session)
+
+
+def refresh_status() -> dict:
+    """Generation, last refresh time (UTC) and last error of the background refresh."""
+    probe = _freshness_probe()
+    with probe["lock"]:
+        return {k: probe[k] for k in ("version", "generation", "refreshed_at", "refreshing", "error")}
+
+
+@st.cache_resource
+def _incremental_state():
+    """Process-wide frames kept between refreshes for high-watermark loads."""
+    return {"lock": threading.Lock(), "frames": {}}
+
+
+def _query(name, spec, prev):
+    """SQL and bind params for a dataset: a full read, or the rows past its watermark."""
+    sql = select_sql(spec["view"], name, extra=spec.get("keys", ()))
+    if "keys" not in spec or prev is None:
+        return sql, None
+    since = cutoffs(watermarks(prev, spec["date_col"]), spec["lookback_days"])
+    where, params = since_clause(since, spec["date_col"])
+    return f"{sql} WHERE {where}", params
+
+
+def load_batch(names=None, session=None, version: str = None) -> dict:
+    """
+    Fetch the named datasets (default: all) concurrently and return {name: frame}.
+
+    Datasets already fetched for the current data `version` (default:
+    data_version()) are served from the result cache; the rest are queried,
+    every query submitted with to_pandas(block=False) before any result is
+    awaited. `session` defaults to the active Snowpark session; any object
+    with the same sql(...).to_pandas(block=False).result() shape will do.
+    """
+    session = session or _default_session
+    names = list(names or DATASETS)
+    version = version or data_version(session)
+    cache = _result_cache()
+    out = {name: result_cache.get(cache, ("dataset", name, version)) for name in names}
+    missing = [name for name in names if out[name] is None]
+    if not missing:
+        return out
+
+    # The incremental state is locked only to read and swap frames, never
+    # across a query, so reruns served from the cache don't wait on a refresh
+    state = _incremental_state()
+    with state["lock"]:
+        prev = {name: state["frames"].get(name) for name in missing}
+    jobs = {}
+    for name in missing:
+        sql, params = _query(name, DATASETS[name], prev[name])
+        jobs[name] = session.sql(sql, params=params).to_pandas(block=False)
+
+    for name, job in jobs.items():
+        spec = DATASETS[name]
+        df = spec["prepare"](job.result())
+        if "keys" in spec:
+            with state["lock"]:
+                # Merged into the latest frame, which a concurrent load may have advanced
+                base = state["frames"].get(name) if prev[name] is not None else None
+                if base is not None:
+                    df = upsert(base, df, spec["keys"], spec["date_col"])
+                else:
+                    # One row per key, as the upserts of later refreshes keep
+                    df = dedupe(df, spec["keys"])
+                # Date-sorted, so the dashboard slices date ranges by binary search
+                df = sort_by_date(df, spec["date_col"])
+                state["frames"][name] = df
+        out[name] = result_cache.put(cache, ("dataset", name, version), df)
+    return out
+
+
+# Structures for the served version and the one being refreshed in
+@st.cache_resource(max_entries=2)
+def _derived(version: str) -> dict:
+    """Indexes and prefix sums built from the frames of data `version`, by name."""
+    return {"lock": threading.Lock(), "entries": {}}
+
+
+def _derive(key: tuple, version: str, df: pd.DataFrame, build):
+    """
+    `build(df)`, frozen, built once per `key` and data version. It is
+    rebuilt if the cache has since refetched the frame, whose row order
+    (which indexes refer to) a new query need not repeat.
+    """
+    store = _derived(version)
+    with store["lock"]:
+        entry = store["entries"].get(key)
+        if entry is None or entry[0] is not df:
+            entry = store["entries"][key] = (df, freeze(build(df)))
+        return entry[1]
+
+
+def filter_index(name: str, df: pd.DataFrame, version: str = None) -> dict:
+    """
+    Row-id index of the loaded frame `df` of dataset `name` for the sidebar
+    filters (see filter_index.py), built once per data `version` (default:
+    data_version()).
+    """
+    return _derive(("index", name), version or data_version(), df, build_index)
+
+
+def date_prefix_sums(name: str, df: pd.DataFrame, keys: tuple, metrics: tuple, version: str = None) -> dict:
+    """
+    Cumulative daily sums per key of the loaded frame `df` of dataset `name`
+    (see prefix_sums.py), built once per data `version` (default: data_version()).
+    """
+    return _derive(
+        ("prefix_sums", name, keys, metrics), version or data_version(), df,
+        lambda df: build_prefix_sums(df, keys, metrics),
+    )
+
+
+def load_dimensions(session=None, version: str = None) -> pd.DataFrame:
+    """
+    Sidebar options without downloading UNIFIED_ADS: one row per
+    (platform, campaign_name) with its date span and row count.
+    """
+    session = session or _default_session
+    version = version or data_version(session)
+    cache = _result_cache()
+    cached = result_cache.get(cache, ("dimensions", version))
+    if cached is not None:
+        return cached
+    sql = (
+        "SELECT platform, campaign_name, MIN(date) AS min_date, MAX(date) AS max_date, "
+        "COUNT(*) AS row_count FROM IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS "
+        "GROUP BY platform, campaign_name ORDER BY platform, campaign_name"
+    )
+    return result_cache.put(cache, ("dimensions", version), _prepare_dimensions(session.sql(sql).to_pandas()))
+
+
+def _fetch_filtered(queries, session, version: str) -> dict:
+    """
+    Results of the FILTERED (name, filter key) `queries` for data
+    `version`, by query: cached ones from the result cache, the others run
+    concurrently in the warehouse. Each is cached per data version and the
+    parts of the key its query applies, so e.g. a new date range only
+    reruns the queries filtered by date.
+    """
+    cache = _result_cache()
+    out, jobs = {}, {}
+    for name, key in queries:
+        spec = FILTERED[name]
+        entry_key = ("filtered", applied_key(key, spec["columns"]), name, version)
+        out[name, key] = result_cache.get(cache, entry_key)
+        if out[name, key] is None:
+            where, params = where_clause(key, spec["columns"])
+            sql = spec["sql"].format(where=where)
+            jobs[name, key] = entry_key, session.sql(sql, params=params).to_pandas(block=False)
+    for (name, key), (entry_key, job) in jobs.items():
+        out[name, key] = result_cache.put(cache, entry_key, FILTERED[name]["prepare"](job.result()))
+    return out
+
+
+def load_filtered(key: tuple, session=None, version: str = None) -> dict:
+    """
+    Run every FILTERED query for a normalized filter key (see
+    pushdown.normalize_filters) concurrently in the warehouse and return
+    {name: frame}, cached per data version.
+    """
+    session = session or _default_session
+    version = version or data_version(session)
+    out = _fetch_filtered([(name, key) for name in FILTERED], session, version)
+    return {name: out[name, key] for name in FILTERED}
+
+
+def load_all():
+    return load_batch()
+
+
+def load_unified_ads():
+    return load_batch(["unified"])["unified"]
+
+
+def load_daily_summary():
+    return load_batch(["daily"])["daily"]
+
+
+def load_campaign_performance():
+    return load_batch(["camp_perf"])["camp_perf"]
+
+
+def load_platform_summary():
+    return load_batch(["plat_summary"])["plat_summary"]
+
+
+def load_weekly_trends():
+    return load_batch(["weekly"])["weekly"]
+
+
 def load_tiktok_funnel():
-    df = _session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.TIKTOK_VIDEO_FUNNEL").to_pandas()
-    df.columns = [c.lower() for c in df.columns]
-    return df
+    return load_batch(["tt_funnel"])["tt_funnel"]
 
 
-@st.cache_data(ttl=600)
 def load_google_quality():
-    df = _session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.GOOGLE_QUALITY_ANALYSIS").to_pandas()
-    df.columns = [c.lower() for c in df.columns]
-    return df
+    return load_batch(["gq"])["gq"]
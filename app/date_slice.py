@@ -0,0 +1,39 @@
+"""
+date_slice.py — Date-range filtering by binary search on date-sorted frames.
+
+Frames are sorted by their date column once, when loaded or built. The
+sorted datetime64 column is then its own date -> row-offset index: a date
+range resolves to a pair of offsets with searchsorted (O(log n)) and comes
+back as a positional slice, without building a Python date per row.
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def sort_by_date(df: pd.DataFrame, col: str = "date") -> pd.DataFrame:
+    """`df` stably sorted by `col` with a fresh RangeIndex (as is, if already sorted)."""
+    if df[col].is_monotonic_increasing:
+        return df
+    return df.sort_values(col, kind="stable", ignore_index=True)
+
+
+def date_offsets(df: pd.DataFrame, start, end, col: str = "date") -> tuple:
+    """Row offsets [lo, hi) of `start <= col <= end` (inclusive days) in a date-sorted frame."""
+    dates = df[col].to_numpy()
+    lo = dates.searchsorted(np.datetime64(pd.Timestamp(start)), side="left")
+    hi = dates.searchsorted(np.datetime64(pd.Timestamp(end) + datetime.timedelta(days=1)), side="left")
+    return lo, hi
+
+
+def date_slice(df: pd.DataFrame, date_range, col: str = "date") -> pd.DataFrame:
+    """
+    Rows of a date-sorted frame within the sidebar's (start, end) range, as
+    a positional slice. A range without both ends selects every row.
+    """
+    if len(date_range) != 2:
+        return df
+    lo, hi = date_offsets(df, date_range[0], date_range[1], col)
+    return df.iloc[lo:hi]
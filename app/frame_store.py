@@ -0,0 +1,173 @@
+"""
+frame_store.py — Process-wide datasets addressed by a version token.
+
+A dataset is loaded once per change of its source files and published
+under a token made of the sources' fingerprint and a load generation.
+Cached builders take that token instead of the frame, so a cache lookup
+hashes a short string rather than every row, and fetch the frame (or a
+frame derived from it, built once per token) from this shared store.
+Each rerun only stat()s the sources to find the current token.
+
+Every session gets the same objects, not copies, so they are frozen when
+stored: frames are re-based on immutable Arrow memory, the value and mask
+arrays of their nullable columns and other NumPy arrays are
+write-protected, so an in-place write to a numeric, boolean, datetime or
+categorical column raises instead of changing what every other session
+sees. Derived per-session frames rely on pandas Copy-on-Write: always on
+from pandas 3, and switched on for pandas 2 by enable_copy_on_write(),
+which the app entry points call at startup.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from columnar_cache import cache_key, source_fingerprint
+
+# Versions kept per dataset, so reruns that started on the previous token
+# can still fetch it while the next one is published
+KEEP_VERSIONS = 2
+
+_STORE = {
+    "lock": threading.Lock(),
+    "generation": 0,
+    "datasets": {},  # name -> {"lock", "fingerprint", "tokens": [oldest .. current]}
+    "entries": {},  # token -> {"value", "key", "derived": {name: value}, "locks": {name: lock}}
+}
+
+
+# Nullable pandas arrays, built from a value and a mask array
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+
+def _read_only_masked(column: pa.ChunkedArray, dtype) -> pd.api.extensions.ExtensionArray:
+    """A nullable array of `dtype` over write-protected value and mask arrays of `column`."""
+    column = column.combine_chunks()
+    fill = False if pa.types.is_boolean(column.type) else 0
+    values = column.fill_null(fill).to_numpy(zero_copy_only=False).astype(dtype.type, copy=False)
+    mask = column.is_null().to_numpy(zero_copy_only=False)
+    values.flags.writeable = False
+    mask.flags.writeable = False
+    return dtype.construct_array_type()(values, mask)
+
+
+def enable_copy_on_write():
+    """
+    Switch on pandas Copy-on-Write, which sharing frozen frames requires.
+    Always on from pandas 3, where the option is deprecated.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def frozen_frame(table: pa.Table) -> pd.DataFrame:
+    """
+    `table` as a DataFrame whose columns cannot be written in place: NumPy
+    columns are zero-copy, read-only views of the Arrow memory, and
+    nullable (Int64, Float64, boolean) columns are rebuilt over
+    write-protected value and mask arrays.
+    """
+    df = table.to_pandas(split_blocks=True)
+    masked = {
+        col: _read_only_masked(table.column(str(col)), df[col].dtype)
+        for col in df.columns if isinstance(df[col].array, MASKED_ARRAYS)
+    }
+    if not masked:
+        return df
+    # Built without copying, which assign() would do
+    return pd.DataFrame({col: masked.get(col, df[col]) for col in df.columns}, index=df.index, copy=False)
+
+
+def freeze(value):
+    """
+    `value` made safe to share between sessions. A DataFrame is returned
+    re-based on Arrow memory (see frozen_frame); NumPy arrays are
+    write-protected, and dicts, lists and tuples are frozen item by item,
+    in place where mutable.
+    """
+    if isinstance(value, pd.DataFrame):
+        return frozen_frame(pa.Table.from_pandas(value))
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            value[k] = freeze(v)
+    elif isinstance(value, list):
+        value[:] = [freeze(v) for v in value]
+    elif isinstance(value, tuple):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _dataset(name: str) -> dict:
+    with _STORE["lock"]:
+        return _STORE["datasets"].setdefault(name, {"lock": threading.Lock(), "fingerprint": None, "tokens": []})
+
+
+def publish(name: str, value, fingerprint: dict = None) -> str:
+    """Store `value`, frozen, as the current version of dataset `name` and return its token."""
+    value = freeze(value)
+    ds = _dataset(name)
+    with _STORE["lock"]:
+        _STORE["generation"] += 1
+        key = cache_key(fingerprint or {}, name)
+        token = f"{name}-{_STORE['generation']}-{key[:12]}"
+        _STORE["entries"][token] = {"value": value, "key": key, "derived": {}, "locks": {}}
+        ds["fingerprint"] = fingerprint
+        ds["tokens"].append(token)
+        for stale in ds["tokens"][:-KEEP_VERSIONS]:
+            _STORE["entries"].pop(stale, None)
+        del ds["tokens"][:-KEEP_VERSIONS]
+    return token
+
+
+def load(name: str, sources, build) -> str:
+    """
+    Token of the current version of dataset `name`, built from `sources`.
+
+    Every call stat()s the source files; `build()` runs (once, even with
+    concurrent callers) only when their fingerprint changed since the
+    version last published.
+    """
+    ds = _dataset(name)
+    with ds["lock"]:
+        fingerprint = source_fingerprint(sources, ds["fingerprint"])
+        if ds["tokens"] and fingerprint == ds["fingerprint"]:
+            return ds["tokens"][-1]
+        return publish(name, build(), fingerprint)
+
+
+def _entry(token: str) -> dict:
+    try:
+        return _STORE["entries"][token]
+    except KeyError:
+        raise KeyError(f"dataset version {token!r} is no longer held; reload the page") from None
+
+
+def fetch(token: str):
+    """The value published under `token`."""
+    return _entry(token)["value"]
+
+
+def content_key(token: str) -> str:
+    """
+    Key of the sources behind `token`: unlike the token, the same for the
+    same source contents across restarts, so it can key persisted results.
+    """
+    return _entry(token)["key"]
+
+
+def derive(token: str, name: str, build):
+    """
+    `build()`'s result for the dataset version `token`, frozen, built once
+    per token (concurrent callers wait for the first) and dropped with it.
+    """
+    entry = _entry(token)
+    with _STORE["lock"]:
+        lock = entry["locks"].setdefault(name, threading.Lock())
+    with lock:
+        if name not in entry["derived"]:
+            entry["derived"][name] = freeze(build())
+        return entry["derived"][name]
@@ -0,0 +1,145 @@
+"""
+freshness.py — Cheap probes of whether the dashboard's source data changed.
+
+Cached query results are keyed on a version token of their sources rather
+than expired on a timer. The ANALYTICS objects are views over the RAW
+tables, so in Snowflake the token is a hash of those tables' LAST_ALTERED
+and ROW_COUNT from INFORMATION_SCHEMA: one metadata query, no warehouse
+scan. Locally it is the CSV exports' fingerprint (see columnar_cache.py),
+which costs a stat() per file while they are unchanged.
+
+A probe remembers the last token and re-reads it at most every
+`interval_s`, so a burst of reruns issues at most one probe. A background
+probe never makes its caller wait after the first read: the re-read, and
+the reload of the changed data by `on_change`, run on one refresh thread
+while the previous version keeps being served, and the new version is
+swapped in only once they finish.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from columnar_cache import cache_key, source_fingerprint
+
+# Tables loaded by sql/02_load_data.sql; every ANALYTICS view reads them
+RAW_TABLES = ["FACEBOOK_ADS", "GOOGLE_ADS", "TIKTOK_ADS"]
+
+PROBE_SQL = (
+    "SELECT table_name, last_altered, row_count FROM IMPROVADO_ADS.INFORMATION_SCHEMA.TABLES "
+    "WHERE table_schema = 'RAW' AND table_name IN ("
+    + ", ".join(f"'{t}'" for t in RAW_TABLES)
+    + ") ORDER BY table_name"
+)
+
+# Seconds a probed version is trusted before the warehouse is asked again
+PROBE_INTERVAL_S = 30.0
+
+
+def table_version(rows: pd.DataFrame) -> str:
+    """Version token of PROBE_SQL's result (any column-name case)."""
+    rows = rows.rename(columns=str.lower).sort_values("table_name")
+    h = hashlib.blake2b(digest_size=12)
+    for name, altered, count in rows[["table_name", "last_altered", "row_count"]].itertuples(index=False):
+        h.update(f"{name}|{pd.Timestamp(altered).isoformat()}|{int(count)};".encode())
+    return h.hexdigest()
+
+
+def warehouse_version(session) -> str:
+    """Version token of the RAW tables, read through a Snowpark-shaped `session`."""
+    return table_version(session.sql(PROBE_SQL).to_pandas())
+
+
+def files_version(paths):
+    """
+    A reader returning the version token of the files at `paths`. It keeps
+    the last fingerprint, so only changed files are hashed again.
+    """
+    state = {"fingerprint": None}
+
+    def read() -> str:
+        state["fingerprint"] = source_fingerprint(paths, state["fingerprint"])
+        return cache_key(state["fingerprint"], "files")
+
+    return read
+
+
+def create_probe(read, interval_s: float = PROBE_INTERVAL_S, on_change=None, background: bool = False) -> dict:
+    """
+    A probe of the version returned by `read(*args)`. When a re-read finds a
+    different version, `on_change(old, new, *args)` runs before the new
+    version is published (e.g. to load its data). With `background`, re-reads
+    run on a refresh thread and callers keep getting the previous version.
+    """
+    return {
+        "read": read,
+        "interval_s": interval_s,
+        "on_change": on_change,
+        "background": background,
+        "lock": threading.Lock(),
+        "version": None,
+        "generation": 0,  # versions published so far
+        "checked_at": None,  # monotonic time of the last re-read started
+        "refreshed_at": None,  # UTC time the current version was last confirmed
+        "refreshing": False,
+        "error": None,  # last failed refresh, the previous version is kept
+        "stats": {"probes": 0, "changes": 0, "errors": 0},
+    }
+
+
+def _refresh(probe: dict, args) -> str:
+    """Re-read the version and, when it changed, run on_change for it."""
+    version = probe["read"](*args)
+    probe["stats"]["probes"] += 1
+    old = probe["version"]
+    if old is not None and version != old:
+        if probe["on_change"] is not None:
+            probe["on_change"](old, version, *args)
+        probe["stats"]["changes"] += 1
+    return version
+
+
+def _publish(probe: dict, version: str):
+    if version != probe["version"]:
+        probe["generation"] += 1
+    probe["version"] = version
+    probe["refreshed_at"] = datetime.now(timezone.utc)
+    probe["error"] = None
+
+
+def _refresh_in_background(probe: dict, args):
+    try:
+        version = _refresh(probe, args)
+    except Exception as exc:  # keep serving the previous version; retried next interval
+        with probe["lock"]:
+            probe["error"] = exc
+            probe["stats"]["errors"] += 1
+            probe["refreshing"] = False
+        return
+    with probe["lock"]:
+        _publish(probe, version)
+        probe["refreshing"] = False
+
+
+def current_version(probe: dict, *args) -> str:
+    """
+    The probe's version, re-read when it is older than the probe's
+    interval: by one caller while the others wait, or for a background
+    probe on a refresh thread (one at a time) while every caller gets the
+    current version. Only the very first read makes a background caller wait.
+    """
+    with probe["lock"]:
+        now = time.monotonic()
+        if probe["checked_at"] is not None and now - probe["checked_at"] < probe["interval_s"]:
+            return probe["version"]
+        if probe["background"] and probe["version"] is not None:
+            if not probe["refreshing"]:
+                probe["refreshing"], probe["checked_at"] = True, now
+                threading.Thread(target=_refresh_in_background, args=(probe, args), daemon=True).start()
+            return probe["version"]
+        _publish(probe, _refresh(probe, args))
+        probe["checked_at"] = now
+        return probe["version"]
@@ -0,0 +1,83 @@
+"""
+incremental.py — High-watermark refresh helpers for append-mostly ad data.
+
+A refresh records the latest date loaded per platform, fetches only rows on
+or after `watermark - lookback_days`, and upserts them into the frame it
+already holds on the dataset's natural key. Restated recent days replace
+their earlier version, and genuinely new rows are appended.
+"""
+
+import pandas as pd
+
+# Natural key of ANALYTICS.UNIFIED_ADS
+UNIFIED_KEYS = ["platform", "date", "campaign_id", "ad_group_id"]
+
+
+def watermarks(df: pd.DataFrame, date_col: str = "date", by: str = "platform") -> dict:
+    """Return {platform: latest date} for `df`."""
+    if df is None or df.empty:
+        return {}
+    marks = df.groupby(by, observed=True)[date_col].max()
+    return {str(k): v for k, v in marks.items()}
+
+
+def cutoffs(marks: dict, lookback_days: int) -> dict:
+    """Shift each watermark back by the restatement window."""
+    return {p: pd.Timestamp(d) - pd.Timedelta(days=lookback_days) for p, d in marks.items()}
+
+
+def since_clause(since: dict, date_col: str = "date", by: str = "platform"):
+    """
+    Build a parameterized WHERE clause selecting rows on or after each
+    platform's cutoff, plus every row of platforms not seen yet.
+
+    Returns (sql, params) for session.sql(..., params=params).
+    """
+    if not since:
+        return "TRUE", []
+    platforms = list(since)
+    parts = [f"{by} NOT IN ({', '.join('?' for _ in platforms)})"]
+    params = list(platforms)
+    for p in platforms:
+        parts.append(f"({by} = ? AND {date_col} >= CAST(? AS DATE))")
+        params += [p, since[p].date().isoformat()]
+    return "(" + " OR ".join(parts) + ")", params
+
+
+def dedupe(df: pd.DataFrame, keys) -> pd.DataFrame:
+    """
+    `df` with one row per key: the last, as a restatement appended after
+    a row replaces it. Full loads apply it too, so they match upserted ones.
+    """
+    return df.drop_duplicates(keys, keep="last").reset_index(drop=True)
+
+
+def _align_categories(base: pd.DataFrame, delta: pd.DataFrame):
+    for col in base.columns:
+        if isinstance(base[col].dtype, pd.CategoricalDtype) and col in delta.columns:
+            cats = base[col].cat.categories.union(pd.Index(delta[col].dropna().unique()), sort=False)
+            dtype = pd.CategoricalDtype(cats)
+            base = base.assign(**{col: base[col].cat.set_categories(cats)})
+            delta = delta.assign(**{col: delta[col].astype(dtype)})
+    return base, delta
+
+
+def upsert(base: pd.DataFrame, delta: pd.DataFrame, keys, date_col: str = "date") -> pd.DataFrame:
+    """
+    Return `base` with `delta` merged in: rows sharing a key are replaced by
+    the `delta` version, the rest are appended. Only base rows dated on or
+    after the earliest delta date are checked for collisions.
+    """
+    if delta is None or delta.empty:
+        return base
+    if base is None or base.empty:
+        return dedupe(delta, keys)
+
+    delta = dedupe(delta, keys)
+    base, delta = _align_categories(base, delta)
+    window = base[date_col] >= delta[date_col].min()
+    stale = pd.Series(False, index=base.index)
+    stale[window] = pd.MultiIndex.from_frame(base.loc[window, keys]).isin(
+        pd.MultiIndex.from_frame(delta[keys])
+    )
+    return pd.concat([base[~stale], delta], ignore_index=True)
@@ -0,0 +1,246 @@
+"""
+ingest.py — CSV ingestion for the local (non-Snowflake) dashboard.
+
+Each platform export is described by a declarative adapter (column mapping,
+spend column, platform-specific metrics, dtypes) and parsed straight into the
+UNIFIED_ADS dtypes. Platforms are read concurrently and concatenated once,
+either whole or in bounded chunks. Chunked reads keep only the columns a
+result needs and one row per UNIFIED_KEYS (the last, as incremental.dedupe
+does for whole reads, so a restated row replaces the earlier one), then
+aggregate once: peak memory follows the distinct ad-group days times the
+columns read instead of the file size.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from incremental import UNIFIED_KEYS
+from kpis import add_kpis
+from schema import UNIFIED_ADS, enforce_schema
+
+# Columns every platform export provides (unified names)
+BASE_COLUMNS = [
+    "date", "campaign_id", "campaign_name", "ad_group_id", "ad_group_name",
+    "impressions", "clicks", "spend", "conversions",
+]
+
+# Grain of the streamed accumulator; every dashboard view rolls up from it
+CUBE_KEYS = ["date", "platform", "campaign_id", "campaign_name"]
+CUBE_METRICS = ["impressions", "clicks", "spend", "conversions", "video_views"]
+
+DEFAULT_CHUNK_ROWS = 250_000
+
+# Deduplicated chunks are buffered until they hold this many times the
+# accumulator's rows, then merged into it in one pass
+MERGE_FACTOR = 2
+
+PLATFORM_ADAPTERS = {}
+
+
+def register_adapter(platform: str, columns: dict = None, spend: str = "spend", metrics=(), dtypes: dict = None):
+    """
+    Declare how a platform export maps onto UNIFIED_ADS.
+
+    columns: source -> unified renames for the base columns
+    spend:   source column holding spend ("spend" or "cost")
+    metrics: platform-specific UNIFIED_ADS columns present in the export
+    dtypes:  parse dtypes overriding UNIFIED_ADS, keyed by unified name
+
+    Source columns not covered (e.g. Google's own ctr/avg_cpc) are never parsed.
+    """
+    renames = dict(columns or {})
+    renames[spend] = "spend"
+    unified_cols = BASE_COLUMNS + list(metrics)
+    source_of = {u: s for s, u in renames.items()}
+    PLATFORM_ADAPTERS[platform] = {
+        "columns": {source_of.get(u, u): u for u in unified_cols},
+        "dtypes": {**{c: UNIFIED_ADS[c] for c in unified_cols}, **(dtypes or {})},
+    }
+
+
+register_adapter(
+    "Facebook",
+    columns={"ad_set_id": "ad_group_id", "ad_set_name": "ad_group_name"},
+    metrics=["video_views", "engagement_rate", "reach", "frequency"],
+)
+register_adapter(
+    "Google",
+    spend="cost",
+    metrics=["conversion_value", "quality_score", "search_impression_share"],
+)
+register_adapter(
+    "TikTok",
+    columns={"adgroup_id": "ad_group_id", "adgroup_name": "ad_group_name"},
+    spend="cost",
+    metrics=[
+        "video_views", "video_watch_25", "video_watch_50", "video_watch_75", "video_watch_100",
+        "likes", "shares", "comments",
+    ],
+)
+
+
+def _read_csv(source, platform: str, columns=None, chunksize: int = None, **kwargs):
+    """
+    pd.read_csv restricted to the adapter's columns (or those mapping to the
+    unified `columns`), parsed into their declared dtypes. With `chunksize`,
+    returns an iterator of such frames.
+    """
+    adapter = PLATFORM_ADAPTERS[platform]
+    src = {s: u for s, u in adapter["columns"].items() if columns is None or u in columns}
+    dtype = {s: adapter["dtypes"][u] for s, u in src.items() if u != "date"}
+    # The C parser's nullable-integer path is several times slower than its
+    # numpy one, so masked dtypes are parsed natively and cast afterwards.
+    masked = {s: d for s, d in dtype.items() if d in ("Int64", "Float64")}
+    native = {s: d for s, d in dtype.items() if s not in masked}
+    parse_dates = ["date"] if "date" in src.values() else False
+    reader = pd.read_csv(
+        source, usecols=list(src), dtype=native, parse_dates=parse_dates, chunksize=chunksize, **kwargs
+    )
+    if chunksize is None:
+        return reader.astype(masked)
+    return (chunk.astype(masked) for chunk in reader)
+
+
+def normalize(df: pd.DataFrame, platform: str) -> pd.DataFrame:
+    """Rename a parsed platform frame to unified column names and tag its platform (in place)."""
+    mapping = PLATFORM_ADAPTERS[platform]["columns"]
+    df.columns = [mapping[c] for c in df.columns]
+    df["platform"] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[platform])
+    return df
+
+
+def derive_kpis(unified: pd.DataFrame) -> pd.DataFrame:
+    """Add the row-level KPIs of the UNIFIED_ADS view and enforce its schema."""
+    return enforce_schema(add_kpis(unified), UNIFIED_ADS)
+
+
+def concat_unified(frames) -> pd.DataFrame:
+    """Concatenate UNIFIED_ADS frames once, unioning categoricals instead of falling back to objects."""
+    frames = [f for f in frames if f is not None]
+    for col, dtype in UNIFIED_ADS.items():
+        if dtype == "category" and all(col in f.columns for f in frames):
+            cats = pd.Index([])
+            for f in frames:
+                cats = cats.append(f[col].cat.categories)
+            cats = cats.unique().sort_values()
+            frames = [f.assign(**{col: f[col].cat.set_categories(cats)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_platform(path, platform: str) -> pd.DataFrame:
+    """Read a whole platform export into the UNIFIED_ADS schema."""
+    return derive_kpis(normalize(_read_csv(path, platform), platform))
+
+
+def read_platforms(sources: dict, max_workers: int = None) -> pd.DataFrame:
+    """
+    Read every {platform: path} export concurrently and concatenate once.
+
+    Threads are enough here: the C CSV parser releases the GIL, and workers
+    hand their frames back without pickling.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or len(sources)) as pool:
+        frames = list(pool.map(lambda item: read_platform(item[1], item[0]), sources.items()))
+    return concat_unified(frames)
+
+
+def read_platform_tail(path, platform: str, offset: int) -> pd.DataFrame:
+    """Read only the rows appended to a platform export after byte `offset`."""
+    with open(path, "rb") as f:
+        header = pd.read_csv(f, nrows=0).columns
+        f.seek(offset)
+        tail = _read_csv(f, platform, header=None, names=header)
+    return derive_kpis(normalize(tail, platform))
+
+
+def iter_platform_chunks(path, platform: str, columns=None, chunksize: int = DEFAULT_CHUNK_ROWS):
+    """
+    Yield normalized chunks of at most `chunksize` rows from a platform export.
+
+    When `columns` (unified names) is given, only the source columns that map
+    to them are parsed.
+    """
+    for chunk in _read_csv(path, platform, columns, chunksize=chunksize):
+        yield normalize(chunk, platform)
+
+
+def _merge(acc, parts, keys) -> pd.DataFrame:
+    frames = ([acc] if acc is not None else []) + parts
+    if len(frames) == 1:
+        return frames[0]
+    return concat_unified(frames).drop_duplicates(keys, keep="last", ignore_index=True)
+
+
+def fold_latest(parts, keys) -> pd.DataFrame:
+    """
+    The rows of `parts` (frames in file order), one per `keys`: the last, as
+    incremental.dedupe keeps. None if there are none. Parts are buffered
+    until they hold MERGE_FACTOR times the accumulator's rows and then
+    merged in one pass, so the cost grows with the rows rather than rows x
+    chunks.
+    """
+    acc, buffer, buffered = None, [], 0
+    for part in parts:
+        part = part.drop_duplicates(keys, keep="last", ignore_index=True)
+        buffer.append(part)
+        buffered += len(part)
+        if acc is None or buffered > MERGE_FACTOR * len(acc):
+            acc, buffer, buffered = _merge(acc, buffer, keys), [], 0
+    if buffer:
+        acc = _merge(acc, buffer, keys)
+    return acc
+
+
+def read_latest(path, platform: str, columns=None, chunksize: int = DEFAULT_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    The UNIFIED_KEYS and `columns` (unified names; None for all) of a
+    platform export, read in chunks, with one row per key (see fold_latest).
+    """
+    if columns is not None:
+        columns = set(columns) | set(UNIFIED_KEYS)
+    return fold_latest(iter_platform_chunks(path, platform, columns, chunksize), UNIFIED_KEYS)
+
+
+def stream_groupby(path, platform: str, by, sums=(), counts=(), chunksize: int = DEFAULT_CHUNK_ROWS):
+    """
+    Sum `sums` (and count non-null `counts`, as `<col>_count`) per `by` over a
+    platform export read in chunks, one row per UNIFIED_KEYS (see read_latest).
+    """
+    by = list(by)
+    rows = read_latest(path, platform, set(by) | set(sums) | set(counts), chunksize)
+    g = rows.groupby(by, sort=False, observed=True, dropna=False)
+    out = g[list(sums)].sum()
+    for c in counts:
+        out[f"{c}_count"] = g[c].count()
+    return out.reset_index()
+
+
+def _stream_platform(path, platform: str, chunksize: int, keep_rows: bool):
+    columns = None if keep_rows else set(CUBE_KEYS) | set(CUBE_METRICS)
+    rows = read_latest(path, platform, columns, chunksize)
+    if "video_views" not in rows.columns:
+        rows["video_views"] = pd.Series(index=rows.index, dtype="Int64")
+    cube = rows.groupby(CUBE_KEYS, sort=False, observed=True, dropna=False)[CUBE_METRICS].sum(min_count=1)
+    return cube, [derive_kpis(rows)] if keep_rows else []
+
+
+def stream_cube(sources: dict, chunksize: int = DEFAULT_CHUNK_ROWS, keep_rows: bool = False, max_workers: int = None):
+    """
+    Stream every platform export into a (date, platform, campaign) cube, one
+    platform per worker thread.
+
+    Returns (cube, rows). `rows` is the full unified frame when `keep_rows`
+    is set and None otherwise; only then are every export's columns held.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or len(sources)) as pool:
+        results = list(pool.map(
+            lambda item: _stream_platform(item[1], item[0], chunksize, keep_rows), sources.items()
+        ))
+
+    cube = pd.concat([acc for acc, _ in results]).reset_index()
+    cube = cube.astype({k: UNIFIED_ADS[k] for k in CUBE_KEYS})
+    cube = cube.astype({m: UNIFIED_ADS[m] for m in CUBE_METRICS})
+    unified = concat_unified([r for _, rows in results for r in rows]) if keep_rows else None
+    return cube, unified
@@ -0,0 +1,73 @@
+"""
+kpis.py — The dashboard's KPI formulas, computed with NumPy.
+
+Every ratio is ROUND(num / NULLIF(den, 0) * scale, decimals) as in
+sql/03_unified_model.sql. Inputs are read once as float64 arrays and each
+KPI is divided into its own preallocated array with np.divide(...,
+where=den != 0), so no nullable/object arithmetic runs. A zero or null
+denominator gives NaN, where SQL gives NULL.
+"""
+
+import numpy as np
+import pandas as pd
+
+# KPI -> (numerator, denominator, scale, decimals)
+KPIS = {
+    "ctr": ("clicks", "impressions", 1, 4),
+    "cpc": ("spend", "clicks", 1, 2),
+    "cpa": ("spend", "conversions", 1, 2),
+    "conversion_rate": ("conversions", "clicks", 1, 4),
+    "cpm": ("spend", "impressions", 1000, 2),
+    "roas": ("conversion_value", "spend", 1, 2),
+}
+
+# The five per-row / per-group KPIs of every UNIFIED_ADS-based view
+STANDARD_KPIS = ["ctr", "cpc", "cpa", "conversion_rate", "cpm"]
+
+
+def as_float(values) -> np.ndarray:
+    """float64 array of a Series or array, nulls as NaN."""
+    if isinstance(values, (pd.Series, pd.Index)):
+        return values.to_numpy(dtype="float64", na_value=np.nan)
+    return np.asarray(values, dtype="float64")
+
+
+def ratio(num, den, scale: float = 1, decimals: int = None, out: np.ndarray = None) -> np.ndarray:
+    """
+    ROUND(num / NULLIF(den, 0) * scale, decimals) as float64, NaN where
+    `den` is 0 or null. Written into `out` when given.
+    """
+    num, den = as_float(num), as_float(den)
+    if out is None:
+        out = np.empty(len(num))
+    out.fill(np.nan)
+    np.divide(num, den, out=out, where=den != 0)
+    if scale != 1:
+        np.multiply(out, scale, out=out)
+    if decimals is not None:
+        np.round(out, decimals, out=out)
+    return out
+
+
+def add_kpis(df: pd.DataFrame, kpis=STANDARD_KPIS, source: str = "", target: str = "",
+             columns: dict = None, copy: bool = False) -> pd.DataFrame:
+    """
+    Add each of `kpis` to `df` as column `target + kpi`, from the metric
+    columns `source + metric` (or `columns[metric]` where given). Columns
+    are added in place unless `copy`; the frame is returned either way.
+    """
+    if copy:
+        df = df.copy()
+    columns = columns or {}
+    inputs = {}
+
+    def col(metric):
+        if metric not in inputs:
+            inputs[metric] = as_float(df[columns.get(metric, source + metric)])
+        return inputs[metric]
+
+    out = np.empty((len(kpis), len(df)))
+    for i, kpi in enumerate(kpis):
+        num, den, scale, decimals = KPIS[kpi]
+        df[target + kpi] = ratio(col(num), col(den), scale, decimals, out=out[i])
+    return df
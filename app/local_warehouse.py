@@ -0,0 +1,191 @@
+"""
+local_warehouse.py — Embedded DuckDB stand-in for the Snowflake warehouse.
+
+Runs sql/01_setup.sql, sql/02_load_data.sql and sql/03_unified_model.sql
+statement by statement against DuckDB, so local runs get the RAW tables and
+ANALYTICS views from the same definitions as Snowflake. A small dialect shim
+rewrites the few Snowflake-only statements (databases, stages, file formats,
+COPY INTO from a stage); everything else, including every view, runs
+verbatim. A row restated later in an export replaces the earlier one, as on
+the pandas engine: each build keeps the last loaded row per RAW_KEYS. The
+built database is kept on disk and reused until a CSV or SQL file changes.
+
+local_session() wraps it in the Snowpark shape data_loader.load_batch()
+expects, so the local dashboard shares the SiS data path. DuckDB has no
+Snowflake INFORMATION_SCHEMA.TABLES, so each build records its RAW tables'
+row counts and build time in METADATA.TABLES, and the session reads that
+instead: the freshness probe (freshness.PROBE_SQL) runs unchanged.
+benchmarks/warehouse_engines.py compares it with the pandas engine.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import duckdb
+except ImportError:  # optional: only needed for ENGINE = "duckdb"
+    duckdb = None
+
+from columnar_cache import cache_key, source_fingerprint
+
+SQL_DIR = Path(__file__).resolve().parent.parent / "sql"
+SCRIPTS = ["01_setup.sql", "02_load_data.sql", "03_unified_model.sql"]
+
+# Mirrors CSV_FORMAT in 01_setup.sql
+CSV_OPTIONS = "HEADER, NULLSTR ('', 'NULL', 'null')"
+
+_SKIPPED = re.compile(r"CREATE\s+(OR\s+REPLACE\s+)?(FILE\s+FORMAT|STAGE)\b", re.I)
+_CREATE_DATABASE = re.compile(r"CREATE\s+DATABASE\s+(IF\s+NOT\s+EXISTS\s+)?(\w+)$", re.I)
+_USE = re.compile(r"USE\s+(DATABASE|SCHEMA)\s+(\w+)$", re.I)
+_TRUNCATE = re.compile(r"TRUNCATE\s+TABLE\s+IF\s+EXISTS\s+(\w+)$", re.I)
+_COPY_FROM_STAGE = re.compile(r"COPY\s+INTO\s+(\w+)\s+FROM\s+@\w+/(\S+)", re.I)
+_INFORMATION_SCHEMA_TABLES = re.compile(r"\bIMPROVADO_ADS\.INFORMATION_SCHEMA\.TABLES\b", re.I)
+
+# Part of the build's cache key; bumped when a build adds objects
+BUILD_VERSION = 3
+
+# Natural key of each RAW table (incremental.UNIFIED_KEYS before the views
+# rename the ad group column and add the platform)
+RAW_KEYS = {
+    "FACEBOOK_ADS": ["date", "campaign_id", "ad_set_id"],
+    "GOOGLE_ADS": ["date", "campaign_id", "ad_group_id"],
+    "TIKTOK_ADS": ["date", "campaign_id", "adgroup_id"],
+}
+
+# Where a build records what Snowflake's INFORMATION_SCHEMA.TABLES reports
+METADATA_TABLE = "IMPROVADO_ADS.METADATA.TABLES"
+
+
+def split_statements(script: str) -> list:
+    """Statements of a SQL script, without `--` comments or blank ones."""
+    text = "\n".join(line.split("--", 1)[0] for line in script.splitlines())
+    return [s.strip() for s in text.split(";") if s.strip()]
+
+
+def translate(statement: str, data_dir: Path, db_path: str):
+    """
+    Rewrite one Snowflake statement for DuckDB, or return None to skip it.
+
+    `db_path` backs CREATE DATABASE; `data_dir` holds the CSVs that
+    COPY INTO ... FROM @STAGE/<file> loads.
+    """
+    flat = " ".join(statement.split())
+    if _SKIPPED.match(flat):
+        return None
+    m = _CREATE_DATABASE.match(flat)
+    if m:
+        return f"ATTACH IF NOT EXISTS '{db_path}' AS {m.group(2)}"
+    m = _USE.match(flat)
+    if m:
+        return f"USE {m.group(2)}"
+    m = _TRUNCATE.match(flat)
+    if m:
+        return f"DELETE FROM {m.group(1)}"
+    m = _COPY_FROM_STAGE.match(flat)
+    if m:
+        path = str(Path(data_dir) / m.group(2)).replace("'", "''")
+        return f"COPY {m.group(1)} FROM '{path}' ({CSV_OPTIONS})"
+    return statement
+
+
+def _run_scripts(con, data_dir: Path, db_path: str, sql_dir: Path):
+    for name in SCRIPTS:
+        for statement in split_statements((sql_dir / name).read_text()):
+            sql = translate(statement, data_dir, db_path)
+            if sql is not None:
+                con.execute(sql)
+
+
+def _dedupe_raw(con):
+    """Delete all but the last loaded row per RAW_KEYS (COPY keeps file order in rowid)."""
+    for table, keys in RAW_KEYS.items():
+        con.execute(
+            f"DELETE FROM IMPROVADO_ADS.RAW.{table} WHERE rowid NOT IN "
+            f"(SELECT MAX(rowid) FROM IMPROVADO_ADS.RAW.{table} GROUP BY {', '.join(keys)})"
+        )
+
+
+def _record_metadata(con):
+    """Fill METADATA_TABLE with each RAW table's row count, altered at build time."""
+    tables = [r[0] for r in con.execute(
+        "SELECT table_name FROM duckdb_tables() "
+        "WHERE database_name = 'IMPROVADO_ADS' AND schema_name = 'RAW' ORDER BY table_name"
+    ).fetchall()]
+    counts = " UNION ALL ".join(
+        f"SELECT '{t}' AS table_name, COUNT(*) AS row_count FROM IMPROVADO_ADS.RAW.{t}" for t in tables
+    )
+    con.execute("CREATE SCHEMA IF NOT EXISTS IMPROVADO_ADS.METADATA")
+    con.execute(
+        f"CREATE OR REPLACE TABLE {METADATA_TABLE} AS "
+        f"SELECT 'IMPROVADO_ADS' AS table_catalog, 'RAW' AS table_schema, table_name, "
+        f"CURRENT_TIMESTAMP AS last_altered, row_count FROM ({counts})"
+    )
+
+
+def translate_query(query: str) -> str:
+    """Rewrite a query sent to a LocalSession: INFORMATION_SCHEMA.TABLES reads METADATA_TABLE."""
+    return _INFORMATION_SCHEMA_TABLES.sub(METADATA_TABLE, query)
+
+
+def open_warehouse(data_dir, cache_dir, sql_dir: Path = SQL_DIR):
+    """
+    Return a DuckDB connection with IMPROVADO_ADS.RAW/ANALYTICS built from
+    `data_dir`'s CSVs, reusing the copy in `cache_dir` while the CSVs and
+    SQL scripts are unchanged.
+    """
+    if duckdb is None:
+        raise ImportError("ENGINE = 'duckdb' needs the duckdb package (pip install duckdb)")
+    sources = sorted(Path(data_dir).glob("*.csv")) + [Path(sql_dir) / n for n in SCRIPTS]
+    key = cache_key(source_fingerprint(sources), f"duckdb-{duckdb.__version__}-{BUILD_VERSION}")
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    db_path = cache_dir / f"warehouse-{key}.duckdb"
+
+    if not db_path.exists():
+        for stale in cache_dir.glob("warehouse-*.duckdb*"):
+            stale.unlink()
+        tmp = cache_dir / f"warehouse-{key}.building.duckdb"
+        tmp.unlink(missing_ok=True)
+        con = duckdb.connect()
+        _run_scripts(con, Path(data_dir), str(tmp).replace("'", "''"), Path(sql_dir))
+        _dedupe_raw(con)
+        _record_metadata(con)
+        con.close()
+        tmp.rename(db_path)
+
+    con = duckdb.connect()
+    path = str(db_path).replace("'", "''")
+    con.execute(f"ATTACH '{path}' AS IMPROVADO_ADS (READ_ONLY)")
+    con.execute("USE IMPROVADO_ADS")
+    return con
+
+
+class _LocalQuery:
+    def __init__(self, session, query: str, params):
+        self._session, self._query, self._params = session, query, params
+
+    def _run(self):
+        # One cursor per query, so concurrent jobs run in parallel in DuckDB
+        return self._session.con.cursor().execute(self._query, self._params or []).df()
+
+    def to_pandas(self, block: bool = True):
+        if block:
+            return self._run()
+        return self._session.pool.submit(self._run)
+
+
+class LocalSession:
+    """Just enough of a Snowpark session for data_loader: sql(...).to_pandas(block=...)."""
+
+    def __init__(self, con, max_workers: int = 8):
+        self.con = con
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def sql(self, query: str, params=None):
+        return _LocalQuery(self, translate_query(query), params)
+
+
+def local_session(data_dir, cache_dir, sql_dir: Path = SQL_DIR) -> LocalSession:
+    """A LocalSession over open_warehouse(data_dir, cache_dir)."""
+    return LocalSession(open_warehouse(data_dir, cache_dir, sql_dir))
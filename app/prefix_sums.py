@@ -0,0 +1,156 @@
+"""
+prefix_sums.py — Date-range totals per key from cumulative daily sums.
+
+For each key (e.g. a (platform, campaign) pair) the metrics of the days it
+has rows are accumulated once, in key then day order, so memory follows
+those (key, day) cells rather than keys x the whole history. The total over
+any inclusive date range is then sums[b] - sums[a], where a and b are
+binary searches of the range's ends among the key's cells: two lookups and
+a subtraction per key, whatever the length of the history. KPI cards and
+per-platform or per-campaign totals are summed from those per-key totals.
+
+group_totals() keeps its per-platform sums between reruns: when the
+sidebar adds or removes a few campaigns, only their totals are added or
+subtracted, so a tweak costs the size of the change, not of the selection.
+"""
+
+import numpy as np
+import pandas as pd
+
+_DAY = np.timedelta64(1, "D")
+
+
+def build_prefix_sums(df: pd.DataFrame, keys, metrics, col: str = "date", decimals: int = 2) -> dict:
+    """
+    Cumulative daily sums of `metrics` per distinct `keys` of `df`, plus
+    the running row count, over the (key, day) cells with rows. Memory is
+    cells x (metrics + 2) values. Totals of non-integer metrics
+    (DECIMAL(12,2) money) are rounded to `decimals` places, dropping the
+    float error of the subtraction.
+    """
+    keys, metrics = list(keys), list(metrics)
+    # Null keys are keys of their own, as in SQL GROUP BY
+    grouped = df.groupby(keys, observed=True, sort=True, dropna=False)
+    pair = grouped.ngroup().to_numpy()
+    labels = grouped.size().index.to_frame(index=False)[keys]
+
+    dates = df[col].to_numpy()
+    start = dates.min() if len(dates) else np.datetime64("NaT", "ns")
+    day = (dates - start) // _DAY
+    days = int(day.max()) + 1 if len(day) else 0
+
+    # Cell of key k on day d sits at k * width + d; every range end
+    # (0 <= d <= days) of key k then sorts between its cells and key k + 1's
+    width = days + 1
+    cells, cell = np.unique(pair * width + day, return_inverse=True)
+    # Column j of sums and rows covers the cells before cell j
+    sums = np.zeros((len(metrics), len(cells) + 1))
+    for i, m in enumerate(metrics):
+        weights = df[m].to_numpy(dtype="float64", na_value=0.0)
+        sums[i, 1:] = np.bincount(cell, weights=weights, minlength=len(cells))
+    np.cumsum(sums, axis=1, out=sums)
+    rows = np.zeros(len(cells) + 1, dtype=np.int64)
+    rows[1:] = np.bincount(cell, minlength=len(cells))
+    np.cumsum(rows, out=rows)
+
+    return {
+        "start": start,
+        "days": days,
+        "width": width,
+        "keys": labels,
+        "metrics": metrics,
+        "dtypes": {m: df[m].dtype for m in metrics},
+        "decimals": decimals,
+        "cells": cells,
+        "sums": sums,
+        "rows": rows,
+    }
+
+
+def _day(prefix: dict, d) -> int:
+    return int((np.datetime64(pd.Timestamp(d), "ns") - prefix["start"]) // _DAY)
+
+
+def day_bounds(prefix: dict, date_range=()) -> tuple:
+    """Day slots [lo, hi) of the inclusive (start, end) `date_range`, clipped to the axis."""
+    lo, hi = 0, prefix["days"]
+    if len(date_range) == 2 and hi:
+        lo = min(max(_day(prefix, date_range[0]), 0), hi)
+        hi = max(min(_day(prefix, date_range[1]) + 1, hi), lo)
+    return lo, hi
+
+
+def _span(prefix: dict, keys: np.ndarray, bounds: tuple) -> tuple:
+    """Positions (a, b) of the first cell of each key in `keys` on or after day lo and hi."""
+    lo, hi = bounds
+    base = keys.astype(np.int64) * prefix["width"]
+    return np.searchsorted(prefix["cells"], base + lo), np.searchsorted(prefix["cells"], base + hi)
+
+
+def _cast(prefix: dict, m: str, values: np.ndarray):
+    dtype = prefix["dtypes"][m]
+    values = np.rint(values) if pd.api.types.is_integer_dtype(dtype) else values.round(prefix["decimals"])
+    return pd.array(values).astype(dtype)
+
+
+def range_totals(prefix: dict, date_range=(), keys=None) -> pd.DataFrame:
+    """
+    Totals of each key over the inclusive (start, end) `date_range` (every
+    day if it lacks either end): the key columns, the metrics in their
+    original dtypes, and `row_count`. `keys` is an optional boolean mask
+    over prefix["keys"]; keys without rows in the range are left out.
+    """
+    n = len(prefix["keys"])
+    sel = np.arange(n) if keys is None else np.flatnonzero(np.asarray(keys, dtype=bool))
+    a, b = _span(prefix, sel, day_bounds(prefix, date_range))
+
+    rows = prefix["rows"][b] - prefix["rows"][a]
+    keep = rows > 0
+    totals = prefix["sums"][:, b] - prefix["sums"][:, a]
+    out = prefix["keys"].iloc[sel[keep]].reset_index(drop=True)
+    for i, m in enumerate(prefix["metrics"]):
+        out[m] = _cast(prefix, m, totals[i][keep])
+    out["row_count"] = rows[keep]
+    return out
+
+
+def group_totals(state: dict, prefix: dict, date_range=(), keys=None, by: str = "platform") -> pd.DataFrame:
+    """
+    Totals per `by` of the selected keys over `date_range`: `by`,
+    `total_<metric>` per metric and `row_count`, for groups with rows.
+
+    `state` (e.g. a dict in st.session_state) keeps the last selection and
+    its sums between calls. When only the key selection changed, the sums
+    are updated with the range totals of just the keys added or removed; a
+    new date range or a rebuilt `prefix` starts them over from zero.
+    """
+    mask = np.ones(len(prefix["keys"]), dtype=bool) if keys is None else np.asarray(keys, dtype=bool)
+    bounds = day_bounds(prefix, date_range)
+    if state.get("prefix") is not prefix or state.get("by") != by or state.get("bounds") != bounds:
+        groups, labels = pd.factorize(prefix["keys"][by], sort=True)
+        state.update(
+            prefix=prefix, by=by, bounds=bounds, groups=groups, labels=labels,
+            mask=np.zeros_like(mask), sums=np.zeros((len(prefix["metrics"]) + 1, len(labels))),
+        )
+
+    added, removed = mask & ~state["mask"], state["mask"] & ~mask
+    changed = added | removed
+    if changed.any():
+        a, b = _span(prefix, np.flatnonzero(changed), bounds)
+        sign = np.where(added[changed], 1.0, -1.0)
+        delta = np.vstack([
+            prefix["sums"][:, b] - prefix["sums"][:, a],
+            prefix["rows"][b] - prefix["rows"][a],
+        ]) * sign
+        groups = state["groups"][changed]
+        for i, row in enumerate(delta):
+            state["sums"][i] += np.bincount(groups, weights=row, minlength=len(state["labels"]))
+        state["mask"] = mask
+
+    sums = state["sums"]
+    present = np.rint(sums[-1]) > 0
+    out = pd.DataFrame({by: state["labels"][present]})
+    for i, m in enumerate(prefix["metrics"]):
+        out["total_" + m] = _cast(prefix, m, sums[i][present])
+    out["row_count"] = np.rint(sums[-1][present]).astype(np.int64)
+    return out
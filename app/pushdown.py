@@ -0,0 +1,68 @@
+"""
+pushdown.py — Sidebar filters as parameterized warehouse predicates.
+
+The sidebar selection (date range, platforms, campaigns) is normalized into
+a hashable key, so equivalent selections share one cache entry, and turned
+into a WHERE clause with bind parameters. Selections covering every option
+add no predicate at all.
+"""
+
+
+def normalize_filters(date_range, platforms, campaigns, bounds=None, all_platforms=(), all_campaigns=()) -> tuple:
+    """
+    Return (start, end, platforms, campaigns) with ISO dates and sorted,
+    de-duplicated tuples. A part equal to its full option set (`bounds`,
+    `all_platforms`, `all_campaigns`) becomes None, meaning "no filter".
+    """
+    start = end = None
+    if len(date_range) == 2:
+        start, end = (d.isoformat() for d in date_range)
+        if bounds is not None and (start, end) == tuple(d.isoformat() for d in bounds):
+            start = end = None
+
+    def _norm(selected, options):
+        selected = tuple(sorted(set(selected)))
+        return None if options and selected == tuple(sorted(set(options))) else selected
+
+    return start, end, _norm(platforms, all_platforms), _norm(campaigns, all_campaigns)
+
+
+def applied_key(key: tuple, columns: dict) -> tuple:
+    """
+    The parts of a normalized filter key that `columns` applies (see
+    where_clause), the others None: selections differing only in filters
+    a query ignores share its result.
+    """
+    start, end, platforms, campaigns = key
+    if "date" not in columns:
+        start = end = None
+    return (
+        start,
+        end,
+        platforms if "platform" in columns else None,
+        campaigns if "campaign" in columns else None,
+    )
+
+
+def where_clause(key: tuple, columns: dict):
+    """
+    Build a parameterized WHERE clause for a normalized filter key.
+
+    `columns` maps "date", "platform" and "campaign" to the view's column
+    for that filter; filters without a column are not applied. Returns
+    (sql, params) for session.sql(..., params=params).
+    """
+    start, end, platforms, campaigns = key
+    parts, params = [], []
+    if "date" in columns and start is not None:
+        parts.append(f"{columns['date']} BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)")
+        params += [start, end]
+    for name, values in (("platform", platforms), ("campaign", campaigns)):
+        if name not in columns or values is None:
+            continue
+        if not values:
+            return "FALSE", []
+        parts.append(f"{columns[name]} IN ({', '.join('?' for _ in values)})")
+        params += list(values)
+    return " AND ".join(parts) or "TRUE", params
+
@@ -0,0 +1,280 @@
+"""
+result_cache.py — TTL- and size-bounded cache of query results as Arrow IPC.
+
+Frames are stored as Arrow IPC stream bytes rather than pickled pandas
+objects, so the cache works inside Streamlit in Snowflake, where pickling
+Snowpark results through st.cache_data is unreliable. Dtypes (categoricals,
+nullable integers, timestamps) round-trip through the pandas metadata Arrow
+keeps in the schema. Each entry is decoded once and the same frame handed
+to every caller: its numeric columns are read-only (mostly views of the
+cached bytes), so a cached frame costs about its IPC size however many
+sessions use it, and must not be modified (pandas Copy-on-Write covers
+frames derived from it). Entries expire after their TTL, if the cache has one
+(callers keying entries on a data version, see freshness.py, need none), and
+the least recently used ones are evicted once the cache holds more than
+`max_bytes`.
+
+A cache can be backed by a directory (attach_disk): every entry is also
+written there as an Arrow IPC file, next to a small JSON file with its
+key, data version and expiry. A memory miss is served from the file
+through a memory map, so a restarted process or a new replica sharing the
+directory starts warm. Processes share it without locks: both files of an
+entry are published by atomic renames, and a hit only touches the
+metadata file's mtime, which records the entry's last use. The directory
+has its own byte budget; its least recently used entries are deleted past
+it, and those written under another `tag` (e.g. by older code) on attach.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from columnar_cache import read_manifest, write_atomic
+from frame_store import frozen_frame
+
+DEFAULT_TTL_S = 600.0
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_DISK_BYTES = 2 * 1024 * 1024 * 1024
+DISK_FORMAT_VERSION = 2
+
+# Seconds after which a data file without its metadata file is taken as
+# abandoned rather than still being written by another process
+ORPHAN_GRACE_S = 3600.0
+
+
+def to_ipc(df: pd.DataFrame) -> pa.Buffer:
+    """`df` as an Arrow IPC stream (index dropped)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def from_ipc(data) -> pd.DataFrame:
+    """
+    The frame written by to_ipc(), read-only (see frame_store.frozen_frame).
+    NumPy columns are zero-copy views of `data`.
+    """
+    return frozen_frame(pa.ipc.open_stream(data).read_all())
+
+
+def create_cache(max_bytes: int = DEFAULT_MAX_BYTES, ttl_s: float = DEFAULT_TTL_S,
+                 disk_dir=None, disk_max_bytes: int = DEFAULT_DISK_BYTES, disk_tag: str = "") -> dict:
+    """
+    An empty cache holding at most `max_bytes` of IPC data, entries living
+    `ttl_s` seconds (None: until evicted or invalidated), backed by
+    `disk_dir` when given (see attach_disk).
+    """
+    cache = {
+        "max_bytes": max_bytes,
+        "ttl_s": ttl_s,
+        "lock": threading.Lock(),
+        "entries": OrderedDict(),  # key -> (buffer, expires at, frame), least recently used first
+        "bytes": 0,
+        "disk": None,
+        "stats": {"hits": 0, "misses": 0, "evictions": 0, "disk_hits": 0, "disk_evictions": 0},
+    }
+    if disk_dir is not None:
+        attach_disk(cache, disk_dir, disk_max_bytes, disk_tag)
+    return cache
+
+
+def attach_disk(cache: dict, path, max_bytes: int = DEFAULT_DISK_BYTES, tag: str = ""):
+    """
+    Back `cache` with Arrow IPC files under `path`, at most `max_bytes` of
+    them. Entries already there (e.g. from before a restart, or written by
+    another process sharing the directory) are served if they were written
+    under the same `tag` (e.g. a digest of the code that built them);
+    entries of other tags, and data files left without metadata, are
+    deleted. Keys must be tuples of literals (str, int, None, ...) so the
+    metadata can record them.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    disk = {"dir": path, "max_bytes": max_bytes, "tag": tag}
+    now = time.time()
+    for meta_path in path.glob("*.json"):
+        meta = read_manifest(meta_path)
+        if meta.get("format") != DISK_FORMAT_VERSION or meta.get("tag") != tag:
+            _unlink(disk, meta_path.stem)
+    for data_path in path.glob("*.arrow"):
+        # A data file is written before its metadata: a recent one may be in flight
+        if not data_path.with_suffix(".json").exists() and _age(data_path, now) > ORPHAN_GRACE_S:
+            _unlink(disk, data_path.stem)
+    cache["disk"] = disk
+
+
+def _age(path: Path, now: float) -> float:
+    try:
+        return now - path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def _entry_name(key) -> str:
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+def _unlink(disk: dict, name: str):
+    # Metadata first, so readers miss the entry before its data goes
+    for suffix in (".json", ".arrow"):
+        try:
+            (disk["dir"] / (name + suffix)).unlink(missing_ok=True)
+        except OSError:  # e.g. still mapped by a reader on Windows; evicted again later
+            pass
+
+
+def _disk_get(cache: dict, key):
+    """The IPC buffer of `key` from the cache's directory (memory-mapped), or None."""
+    disk = cache["disk"]
+    name = _entry_name(key)
+    meta_path = disk["dir"] / f"{name}.json"
+    meta = read_manifest(meta_path)
+    if meta.get("tag") != disk["tag"] or meta.get("key") != repr(key):
+        return None
+    if meta["expires"] is not None and meta["expires"] <= time.time():
+        _unlink(disk, name)
+        return None
+    try:
+        buf = pa.memory_map(str(disk["dir"] / f"{name}.arrow"), "r").read_buffer()
+        # The metadata file's mtime is the entry's last use, for eviction
+        os.utime(meta_path)
+    except OSError:  # evicted by another process meanwhile
+        return None
+    return buf
+
+
+def _disk_put(cache: dict, key, buf: pa.Buffer, ttl_s: float):
+    disk = cache["disk"]
+    if buf.size > disk["max_bytes"]:
+        return
+    name = _entry_name(key)
+    meta = {
+        "format": DISK_FORMAT_VERSION,
+        "tag": disk["tag"],
+        "key": repr(key),
+        "version": str(key[-1]) if isinstance(key, tuple) and key else None,
+        "bytes": buf.size,
+        "expires": None if ttl_s is None else time.time() + ttl_s,
+    }
+    write_atomic(disk["dir"] / f"{name}.arrow", lambda t: t.write_bytes(buf))
+    write_atomic(disk["dir"] / f"{name}.json", lambda t: t.write_text(json.dumps(meta)))
+    _evict_disk(cache)
+
+
+def _evict_disk(cache: dict):
+    """Delete the least recently used entries of the directory past its byte budget."""
+    disk = cache["disk"]
+    entries = []
+    for meta_path in disk["dir"].glob("*.json"):
+        try:
+            used = meta_path.stat().st_mtime
+            size = meta_path.with_suffix(".arrow").stat().st_size
+        except OSError:
+            continue
+        entries.append((used, size, meta_path.stem))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= disk["max_bytes"]:
+            break
+        _unlink(disk, name)
+        total -= size
+        with cache["lock"]:
+            cache["stats"]["disk_evictions"] += 1
+
+
+def _drop(cache: dict, key):
+    buf = cache["entries"].pop(key)[0]
+    cache["bytes"] -= buf.size
+
+
+def _insert(cache: dict, key, buf: pa.Buffer, expires: float) -> pd.DataFrame:
+    """
+    Hold `buf` and its decoded frame in memory, evicting expired then least
+    recently used entries for room, and return the frame.
+    """
+    frame = from_ipc(buf)
+    with cache["lock"]:
+        if key in cache["entries"]:
+            _drop(cache, key)
+        if buf.size > cache["max_bytes"]:
+            return frame
+        now = time.monotonic()
+        for stale in [k for k, (_, exp, _) in cache["entries"].items() if exp <= now]:
+            _drop(cache, stale)
+        while cache["entries"] and cache["bytes"] + buf.size > cache["max_bytes"]:
+            _drop(cache, next(iter(cache["entries"])))
+            cache["stats"]["evictions"] += 1
+        cache["entries"][key] = (buf, expires, frame)
+        cache["bytes"] += buf.size
+    return frame
+
+
+def get(cache: dict, key):
+    """
+    The frame cached under `key` in memory or on disk (shared, read-only),
+    or None if absent or expired.
+    """
+    with cache["lock"]:
+        entry = cache["entries"].get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            _drop(cache, key)
+            entry = None
+        if entry is not None:
+            cache["entries"].move_to_end(key)
+            cache["stats"]["hits"] += 1
+            return entry[2]
+    buf = _disk_get(cache, key) if cache["disk"] is not None else None
+    if buf is None:
+        with cache["lock"]:
+            cache["stats"]["misses"] += 1
+        return None
+    ttl_s = cache["ttl_s"]
+    frame = _insert(cache, key, buf, float("inf") if ttl_s is None else time.monotonic() + ttl_s)
+    with cache["lock"]:
+        cache["stats"]["disk_hits"] += 1
+    return frame
+
+
+def put(cache: dict, key, df: pd.DataFrame, ttl_s: float = None) -> pd.DataFrame:
+    """
+    Cache `df` under `key` for `ttl_s` seconds (default: the cache's TTL;
+    None keeps it until evicted).
+    Returns the cached frame, as later hits will, so hits and misses hand
+    back identical frames. A frame larger than the whole cache is not stored.
+    """
+    buf = to_ipc(df)
+    ttl_s = cache["ttl_s"] if ttl_s is None else ttl_s
+    frame = _insert(cache, key, buf, float("inf") if ttl_s is None else time.monotonic() + ttl_s)
+    if cache["disk"] is not None:
+        _disk_put(cache, key, buf, ttl_s)
+    return frame
+
+
+def cached(cache: dict, key, build) -> pd.DataFrame:
+    """The frame cached under `key`, or `build()`'s result, cached."""
+    df = get(cache, key)
+    return put(cache, key, build()) if df is None else df
+
+
+def invalidate(cache: dict, match=None):
+    """Drop every entry, or those whose key satisfies `match(key)`, from memory and disk."""
+    with cache["lock"]:
+        for key in [k for k in cache["entries"] if match is None or match(k)]:
+            _drop(cache, key)
+    disk = cache["disk"]
+    if disk is None:
+        return
+    for meta_path in disk["dir"].glob("*.json"):
+        meta = read_manifest(meta_path)
+        if "key" in meta and (match is None or match(ast.literal_eval(meta["key"]))):
+            _unlink(disk, meta_path.stem)
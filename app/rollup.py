@@ -0,0 +1,64 @@
+"""
+rollup.py — One-pass base cube and the roll-ups the dashboard views need.
+
+The unified frame is scanned once into a base cube of additive metrics at
+(date, platform, campaign, ad group) grain. Every view then aggregates the
+cube instead of the raw rows, so view cost follows the cube size. Period
+truncation and LAG-style change columns are vectorized for the trend views.
+"""
+
+import pandas as pd
+
+from kpis import as_float, ratio
+
+# Grain of the base cube; campaign_name rides along with campaign_id
+BASE_KEYS = ["date", "platform", "campaign_id", "campaign_name", "ad_group_id"]
+BASE_METRICS = ["impressions", "clicks", "spend", "conversions", "video_views"]
+
+
+def base_cube(unified: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum BASE_METRICS per BASE_KEYS in a single groupby. Keys or metrics
+    absent from `unified` (e.g. ad_group_id in the streaming cube) are skipped.
+    Null keys form their own group, as in SQL GROUP BY.
+    """
+    keys = [k for k in BASE_KEYS if k in unified.columns]
+    metrics = [m for m in BASE_METRICS if m in unified.columns]
+    return unified.groupby(keys, as_index=False, sort=False, observed=True, dropna=False)[metrics].sum()
+
+
+def rollup(cube: pd.DataFrame, by, metrics=BASE_METRICS, prefix: str = "") -> pd.DataFrame:
+    """Sum `metrics` of `cube` per `by`, renaming each to `prefix + name`."""
+    g = cube.groupby(list(by), as_index=False, observed=True, dropna=False)[list(metrics)].sum()
+    return g.rename(columns={m: prefix + m for m in metrics})
+
+
+# Change-column suffix per period, e.g. spend_wow_change for weeks
+CHANGE_SUFFIX = {"day": "dod", "week": "wow", "month": "mom", "quarter": "qoq", "year": "yoy"}
+
+
+def period_start(dates: pd.Series, period: str = "week", week_start: int = 0) -> pd.Series:
+    """
+    Vectorized DATE_TRUNC(period, date) for "day", "week", "month",
+    "quarter" or "year". Weeks begin on `week_start` (0 = Monday, as
+    Snowflake's default DATE_TRUNC('WEEK'), through 6 = Sunday).
+    """
+    days = dates.dt.normalize()
+    if period == "day":
+        return days
+    if period == "week":
+        return days - pd.to_timedelta((days.dt.dayofweek - week_start) % 7, unit="D")
+    freq = {"month": "M", "quarter": "Q", "year": "Y"}[period]
+    return days.dt.to_period(freq).dt.start_time.astype(days.dtype)
+
+
+def lag_change(g: pd.DataFrame, by, cols, suffix: str) -> pd.DataFrame:
+    """
+    Add `<col>_<suffix>_change` = (x - LAG(x)) / NULLIF(LAG(x), 0) per `by`,
+    rounded to 4 places, using `g`'s row order within each group.
+    """
+    prev = g.groupby(list(by), observed=True)[list(cols)].shift()
+    for c in cols:
+        last = as_float(prev[c])
+        g[f"{c}_{suffix}_change"] = ratio(as_float(g[c]) - last, last, decimals=4)
+    return g
@@ -0,0 +1,89 @@
+"""
+schema.py — Declared dtypes for the unified ads model.
+
+UNIFIED_ADS mirrors the column order and casts of ANALYTICS.UNIFIED_ADS in
+sql/03_unified_model.sql: VARCHAR dimensions become categoricals, INT
+columns nullable Int64, DECIMAL(12,2) money columns Float64, and
+DECIMAL(10,x) rates plus the derived KPIs float32. Every loader (CSV or
+Snowflake) passes its frame through enforce_schema() so no column is left
+as Python objects.
+"""
+
+import hashlib
+
+import pandas as pd
+
+UNIFIED_ADS = {
+    "platform": "category",
+    "date": "datetime64[ns]",
+    "campaign_id": "category",
+    "campaign_name": "category",
+    "ad_group_id": "category",
+    "ad_group_name": "category",
+    "impressions": "Int64",
+    "clicks": "Int64",
+    "spend": "Float64",
+    "conversions": "Int64",
+    # Standard KPIs
+    "ctr": "float32",
+    "cpc": "float32",
+    "cpa": "float32",
+    "conversion_rate": "float32",
+    "cpm": "float32",
+    # Facebook-specific
+    "video_views": "Int64",
+    "engagement_rate": "float32",
+    "reach": "Int64",
+    "frequency": "float32",
+    # Google-specific
+    "conversion_value": "Float64",
+    "quality_score": "Int64",
+    "search_impression_share": "float32",
+    # TikTok-specific
+    "video_watch_25": "Int64",
+    "video_watch_50": "Int64",
+    "video_watch_75": "Int64",
+    "video_watch_100": "Int64",
+    "likes": "Int64",
+    "shares": "Int64",
+    "comments": "Int64",
+}
+
+
+def _cast(s: pd.Series, dtype: str) -> pd.Series:
+    if str(s.dtype) == dtype:
+        return s
+    if dtype == "category":
+        return s.astype("category")
+    if dtype.startswith("datetime"):
+        return pd.to_datetime(s).astype(dtype)
+    if s.dtype == object:
+        # Snowflake DECIMALs arrive as decimal.Decimal objects
+        s = pd.to_numeric(s, errors="coerce")
+    return s.astype(dtype)
+
+
+def enforce_schema(df: pd.DataFrame, schema: dict = UNIFIED_ADS) -> pd.DataFrame:
+    """
+    Return `df` with exactly the columns of `schema`, in order, cast to their
+    declared dtypes. Declared columns missing from `df` are added as typed nulls.
+    """
+    out = {}
+    for col, dtype in schema.items():
+        if col in df.columns:
+            out[col] = _cast(df[col], dtype)
+        else:
+            out[col] = pd.Series(index=df.index, dtype=dtype)
+    return pd.DataFrame(out, index=df.index)
+
+
+def subset(schema: dict, columns) -> dict:
+    """The part of `schema` covering `columns`, in schema order (for projected reads)."""
+    columns = set(columns)
+    return {c: t for c, t in schema.items() if c in columns}
+
+
+def schema_version(schema: dict = UNIFIED_ADS) -> str:
+    """Short digest of `schema`, for keying caches of frames that follow it."""
+    spec = ",".join(f"{c}:{t}" for c, t in schema.items())
+    return hashlib.blake2b(spec.encode(), digest_size=8).hexdigest()
@@ -3,36 +3,40 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from snowflake.snowpark.context import get_active_session
+from data_loader import (
+    PUSHDOWN_MIN_ROWS, data_version, date_prefix_sums, filter_index, load_batch, load_dimensions, load_filtered,
+)
+from filter_index import select, selection_mask
+from frame_store import enable_copy_on_write
+from prefix_sums import group_totals
+from pushdown import normalize_filters
 
 # ── Session & Config ─────────────────────────────────────────────────────────
 session = get_active_session()
 st.set_page_config(page_title="Cross-Channel Ad Performance", layout="wide")
 COLORS = {"Facebook": "#1877F2", "Google": "#34A853", "TikTok": "#000000"}
+# Sessions share read-only frames; their derived frames need Copy-on-Write
+enable_copy_on_write()
+
+# "download" fetches UNIFIED_ADS once and filters in pandas; "pushdown" runs
+# the filters in the warehouse and fetches aggregates; "auto" picks by size.
+FILTER_MODE = "auto"
+
+# ── Load Data (cached as Arrow IPC bytes – see result_cache.py) ──────────────
+# Every load of a rerun reads the same version of the RAW tables. Sidebar
+# options come from a small per-campaign summary of UNIFIED_ADS.
+version = data_version(session)
+dims = load_dimensions(session=session, version=version)
+if FILTER_MODE == "auto":
+    pushdown = int(dims["row_count"].sum()) >= PUSHDOWN_MIN_ROWS
+else:
+    pushdown = FILTER_MODE == "pushdown"
 
-# ── Load Data (no caching – small dataset, avoids SiS serialization issues) ──
-unified = session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS").to_pandas()
-unified.columns = [c.lower() for c in unified.columns]
-unified["date"] = pd.to_datetime(unified["date"])
-
-daily = session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.DAILY_PLATFORM_SUMMARY").to_pandas()
-daily.columns = [c.lower() for c in daily.columns]
-daily["date"] = pd.to_datetime(daily["date"])
-
-camp_perf = session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.CAMPAIGN_PERFORMANCE").to_pandas()
-camp_perf.columns = [c.lower() for c in camp_perf.columns]
-
-plat_summary = session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.PLATFORM_SUMMARY").to_pandas()
-plat_summary.columns = [c.lower() for c in plat_summary.columns]
-
-weekly = session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.WEEKLY_TRENDS").to_pandas()
-weekly.columns = [c.lower() for c in weekly.columns]
-weekly["week_start"] = pd.to_datetime(weekly["week_start"])
-
-tt_funnel = session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.TIKTOK_VIDEO_FUNNEL").to_pandas()
-tt_funnel.columns = [c.lower() for c in tt_funnel.columns]
-
-gq = session.sql("SELECT * FROM IMPROVADO_ADS.ANALYTICS.GOOGLE_QUALITY_ANALYSIS").to_pandas()
-gq.columns = [c.lower() for c in gq.columns]
+# The ANALYTICS views are fetched as concurrent Snowpark async jobs. With
+# pushdown only the unfiltered ones are downloaded here.
+data = load_batch(["tt_funnel", "gq"] if pushdown else None, session=session, version=version)
+tt_funnel = data["tt_funnel"]
+gq = data["gq"]
 
 # ── Header ───────────────────────────────────────────────────────────────────
 st.title("Cross-Channel Advertising Performance")
@@ -41,36 +45,55 @@ st.caption("Facebook Ads | Google Ads | TikTok Ads — Unified analytics")
 # ── Sidebar Filters ──────────────────────────────────────────────────────────
 with st.sidebar:
     st.header("Filters")
-    min_d, max_d = unified["date"].min().date(), unified["date"].max().date()
+    min_d, max_d = dims["min_date"].min().date(), dims["max_date"].max().date()
     date_range = st.date_input("Date Range", value=(min_d, max_d), min_value=min_d, max_value=max_d)
-    all_plat = sorted(unified["platform"].unique())
+    all_plat = sorted(dims["platform"].unique())
     platforms = st.multiselect("Platform", options=all_plat, default=all_plat)
-    avail_camps = sorted(unified[unified["platform"].isin(platforms)]["campaign_name"].unique())
+    avail_camps = sorted(dims[dims["platform"].isin(platforms)]["campaign_name"].unique())
     campaigns = st.multiselect("Campaign", options=avail_camps, default=avail_camps)
 
 # ── Apply Filters ────────────────────────────────────────────────────────────
-if len(date_range) == 2:
-    mask = (
-        (unified["date"].dt.date >= date_range[0])
-        & (unified["date"].dt.date <= date_range[1])
-        & (unified["platform"].isin(platforms))
-        & (unified["campaign_name"].isin(campaigns))
-    )
+if pushdown:
+    # Filters become WHERE clauses; only aggregates come back, cached per key
+    filter_key = normalize_filters(date_range, platforms, campaigns, bounds=(min_d, max_d),
+                                   all_platforms=all_plat, all_campaigns=avail_camps)
+    filtered = load_filtered(filter_key, session=session, version=version)
+    plat_agg = filtered["plat_agg"]
+    daily_f = filtered["daily"]
+    camp_f = filtered["camp_perf"]
+    plat_f = filtered["plat_summary"]
+    weekly_f = filtered["weekly"]
 else:
-    mask = unified["platform"].isin(platforms) & unified["campaign_name"].isin(campaigns)
+    unified = data["unified"]
+    daily = data["daily"]
+    camp_perf = data["camp_perf"]
+    plat_summary = data["plat_summary"]
+    weekly = data["weekly"]
+
+    # KPI totals are two prefix-sum lookups per selected campaign, carried
+    # over in session state so a sidebar tweak only adds or subtracts the
+    # campaigns it changed; the other frames are date-sorted, so a date range
+    # is a binary-searched slice, and platform/campaign selections come from
+    # per-value row-id indexes
+    selected = {"platform": platforms, "campaign_name": campaigns}
+    unified_sums = date_prefix_sums(
+        "unified", unified, ("platform", "campaign_name"), ("impressions", "clicks", "spend", "conversions"),
+        version=version,
+    )
+    camp_sel = selection_mask(filter_index("unified_keys", unified_sums["keys"], version), selected)
+    plat_agg = group_totals(st.session_state.setdefault("plat_totals", {}), unified_sums, date_range, camp_sel)
 
-fdf = unified[mask].copy()
-if fdf.empty:
-    st.warning("No data for selected filters.")
-    st.stop()
+    by_platform = {"platform": platforms}
+    daily_f = select(daily, filter_index("daily", daily, version), by_platform, date_range)
 
-daily_f = daily[(daily["platform"].isin(platforms))].copy()
-if len(date_range) == 2:
-    daily_f = daily_f[(daily_f["date"].dt.date >= date_range[0]) & (daily_f["date"].dt.date <= date_range[1])]
+    # Views or masked selections of the shared frames, not copies
+    camp_f = select(camp_perf, filter_index("camp_perf", camp_perf, version), selected)
+    plat_f = select(plat_summary, filter_index("plat_summary", plat_summary, version), by_platform)
+    weekly_f = select(weekly, filter_index("weekly", weekly, version), by_platform)
 
-camp_f = camp_perf[(camp_perf["platform"].isin(platforms)) & (camp_perf["campaign_name"].isin(campaigns))].copy()
-plat_f = plat_summary[plat_summary["platform"].isin(platforms)].copy()
-weekly_f = weekly[weekly["platform"].isin(platforms)].copy()
+if plat_agg["row_count"].sum() == 0:
+    st.warning("No data for selected filters.")
+    st.stop()
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -82,10 +105,10 @@ tab1, tab2, tab3, tab4 = st.tabs(
 
 # ── TAB 1: EXECUTIVE OVERVIEW ────────────────────────────────────────────────
 with tab1:
-    total_spend = float(fdf["spend"].sum())
-    total_imp = int(fdf["impressions"].sum())
-    total_clicks = int(fdf["clicks"].sum())
-    total_conv = int(fdf["conversions"].sum())
+    total_spend = float(plat_agg["total_spend"].sum())
+    total_imp = int(plat_agg["total_impressions"].sum())
+    total_clicks = int(plat_agg["total_clicks"].sum())
+    total_conv = int(plat_agg["total_conversions"].sum())
     avg_cpa = total_spend / total_conv if total_conv else 0
     avg_ctr = total_clicks / total_imp if total_imp else 0
     avg_cpc = total_spend / total_clicks if total_clicks else 0
@@ -113,9 +136,6 @@ with tab1:
     st.plotly_chart(fig, use_container_width=True)
 
     # Donut + Conversions bar
-    plat_agg = fdf.groupby("platform", as_index=False).agg(
-        total_spend=("spend", "sum"), total_conversions=("conversions", "sum"))
-
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Spend Distribution")
@@ -146,7 +166,7 @@ with tab2:
     if not plat_f.empty:
         disp = plat_f[["platform","campaigns","total_impressions","total_clicks","total_spend",
                         "total_conversions","avg_ctr","avg_cpc","avg_cpa","avg_conversion_rate",
-                        "avg_cpm","spend_share","conversion_share"]].copy()
+                        "avg_cpm","spend_share","conversion_share"]]
         disp.columns = ["Platform","Campaigns","Impressions","Clicks","Spend ($)","Conversions",
                          "CTR","CPC ($)","CPA ($)","Conv Rate","CPM ($)","Spend Share","Conv Share"]
         st.dataframe(disp.style.format({
@@ -244,7 +264,7 @@ with tab3:
     if not camp_f.empty:
         disp = camp_f[["platform","campaign_name","total_spend","total_impressions","total_clicks",
                         "total_conversions","avg_ctr","avg_cpc","avg_cpa","avg_conversion_rate",
-                        "spend_rank","cpa_rank"]].copy()
+                        "spend_rank","cpa_rank"]]
         disp.columns = ["Platform","Campaign","Spend ($)","Impressions","Clicks","Conversions",
                          "CTR","CPC ($)","CPA ($)","Conv Rate","Spend Rank","CPA Rank"]
         st.dataframe(disp.style.format({
@@ -0,0 +1,104 @@
+"""
+batch_latency.py — Timing of data_loader.load_batch() against a slow stand-in session.
+
+The seven ANALYTICS views are loaded through the DuckDB stand-in
+(app/local_warehouse.py) wrapped in a session that injects a fixed latency
+per view before each query, as a Snowflake round trip would. Since
+load_batch() submits every query before awaiting any, the batch should
+take about as long as its slowest query; the same session run one query
+at a time (what seven blocking session.sql() calls cost) takes their sum.
+
+    python benchmarks/batch_latency.py [--scale 1.0] [--work-dir DIR]
+
+Needs duckdb and streamlit. Exits non-zero if the concurrent batch takes
+more than MAX_OVERHEAD times its slowest query.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "app"))
+
+import data_loader  # noqa: E402
+from local_warehouse import local_session  # noqa: E402
+
+# Seconds injected per view (before --scale)
+LATENCY_S = {
+    "UNIFIED_ADS": 0.8,
+    "DAILY_PLATFORM_SUMMARY": 0.3,
+    "CAMPAIGN_PERFORMANCE": 0.4,
+    "PLATFORM_SUMMARY": 0.1,
+    "WEEKLY_TRENDS": 0.5,
+    "TIKTOK_VIDEO_FUNNEL": 0.2,
+    "GOOGLE_QUALITY_ANALYSIS": 0.2,
+}
+
+# Allowed batch time as a multiple of the slowest query
+MAX_OVERHEAD = 1.25
+
+
+class SlowQuery:
+    def __init__(self, session, query: str, params):
+        self.session, self.query, self.params = session, query, params
+
+    def _run(self):
+        view = next(v for v in LATENCY_S if f".{v} " in self.query + " ")
+        time.sleep(LATENCY_S[view] * self.session.scale)
+        return self.session.inner.sql(self.query, self.params).to_pandas()
+
+    def to_pandas(self, block: bool = True):
+        if block:
+            return self._run()
+        if self.session.concurrent:
+            return self.session.inner.pool.submit(self._run)
+        done = Future()  # ran to completion before the next query is submitted
+        done.set_result(self._run())
+        return done
+
+
+class SlowSession:
+    """A LocalSession whose queries wait their view's latency first; `concurrent=False` runs them in turn."""
+
+    def __init__(self, inner, scale: float, concurrent: bool):
+        self.inner, self.scale, self.concurrent = inner, scale, concurrent
+
+    def sql(self, query: str, params=None):
+        return SlowQuery(self, query, params)
+
+
+def timed_batch(session, version: str) -> float:
+    """Seconds to load every dataset cold (a new `version`, no incremental state)."""
+    data_loader._incremental_state()["frames"].clear()
+    start = time.perf_counter()
+    data_loader.load_batch(session=session, version=version)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier of the injected latencies")
+    parser.add_argument("--work-dir", type=Path, default=Path(tempfile.gettempdir()) / "batch_latency")
+    args = parser.parse_args()
+
+    inner = local_session(ROOT / "data", args.work_dir)
+    slowest = max(LATENCY_S.values()) * args.scale
+    total = sum(LATENCY_S.values()) * args.scale
+    timed_batch(SlowSession(inner, 0, True), "warm-up")
+    one_by_one = timed_batch(SlowSession(inner, args.scale, False), "one-by-one")
+    batch = timed_batch(SlowSession(inner, args.scale, True), "batch")
+
+    print(f"{len(LATENCY_S)} views, injected latency {total:.2f} s in total, slowest {slowest:.2f} s")
+    print(f"one query at a time: {one_by_one:.2f} s")
+    print(f"load_batch:          {batch:.2f} s ({batch / slowest:.2f}x the slowest query)")
+    ok = batch <= slowest * MAX_OVERHEAD
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+freshness_probe.py — Check of data_loader's change-driven refresh on the local warehouse.
+
+A copy of data/ is loaded into the DuckDB stand-in (app/local_warehouse.py),
+whose METADATA.TABLES answers freshness.PROBE_SQL as Snowflake's
+INFORMATION_SCHEMA.TABLES would. With the probe interval at zero, every
+load_batch() re-probes the RAW tables in the background; each step counts
+the probe and dataset queries the session received:
+
+1. first load: one probe, every dataset queried
+2. rerun with the data unchanged: one probe, no dataset refetched
+3. a row appended to a CSV and the warehouse rebuilt: the probe sees a
+   new version and the datasets are refetched once, in the background
+4. rerun on the new version: one probe, no dataset refetched
+
+    python benchmarks/freshness_probe.py [--work-dir DIR]
+
+Needs duckdb and streamlit. Exits non-zero if a step queries anything else.
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "app"))
+
+import data_loader  # noqa: E402
+from freshness import PROBE_SQL  # noqa: E402
+from local_warehouse import local_session  # noqa: E402
+
+NAMES = ["daily", "camp_perf", "plat_summary", "weekly", "tt_funnel", "gq"]
+APPENDED = "2024-01-30,fb_1004,Video_Views_Campaign,fbset_2099,Probe_Check,1000,10,1000.00,1,10,0.01,900,1.1\n"
+
+
+class CountingSession:
+    """Passes queries to a LocalSession, counting probes and other queries."""
+
+    def __init__(self, session):
+        self.session = session
+        self.counts = {"probe": 0, "data": 0}
+
+    def sql(self, query: str, params=None):
+        self.counts["probe" if query == PROBE_SQL else "data"] += 1
+        return self.session.sql(query, params)
+
+
+def settle(timeout_s: float = 60.0):
+    """Wait for the background probe (and any reload it started) to finish."""
+    deadline = time.monotonic() + timeout_s
+    while data_loader.refresh_status()["refreshing"]:
+        if time.monotonic() > deadline:
+            raise TimeoutError("background refresh did not finish")
+        time.sleep(0.01)
+
+
+def step(label: str, session: CountingSession, expect: dict, run) -> tuple:
+    """Run `run()` and settle; (whether the counted queries match `expect`, its result)."""
+    session.counts.update(probe=0, data=0)
+    before = data_loader.refresh_status()["generation"]
+    out = run()
+    settle()
+    changed = data_loader.refresh_status()["generation"] - before
+    got = {**session.counts, "version changes": changed}
+    ok = got == expect
+    print(f"{label:<38} {got['probe']:>6} {got['data']:>5} {changed:>8}  {'ok' if ok else f'expected {expect}'}")
+    return ok, out
+
+
+def total_spend(data: dict) -> float:
+    return float(data["plat_summary"]["total_spend"].sum())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--work-dir", type=Path, default=Path(tempfile.gettempdir()) / "freshness_probe")
+    args = parser.parse_args()
+
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+    data_dir, cache_dir = args.work_dir / "data", args.work_dir / ".cache"
+    shutil.copytree(ROOT / "data", data_dir)
+    data_loader.PROBE_INTERVAL_S = 0
+
+    session = CountingSession(local_session(data_dir, cache_dir))
+
+    def load():
+        return data_loader.load_batch(NAMES, session=session)
+
+    print(f"{'step':<38} {'probes':>6} {'data':>5} {'versions':>8}")
+    ok1, first = step("first load", session, {"probe": 1, "data": len(NAMES), "version changes": 1}, load)
+    ok2, _ = step("rerun, data unchanged", session, {"probe": 1, "data": 0, "version changes": 0}, load)
+
+    with open(data_dir / "01_facebook_ads.csv", "a") as f:
+        f.write(APPENDED)
+    session = CountingSession(local_session(data_dir, cache_dir))
+    ok3, _ = step("row appended, warehouse rebuilt", session, {"probe": 1, "data": len(NAMES), "version changes": 1},
+                  lambda: data_loader.data_version(session))
+    ok4, second = step("rerun on the new version", session, {"probe": 1, "data": 0, "version changes": 0}, load)
+
+    added = total_spend(second) - total_spend(first)
+    print(f"total spend {total_spend(first):,.2f} -> {total_spend(second):,.2f}")
+    ok = ok1 and ok2 and ok3 and ok4 and round(added, 2) == 1000.0
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+pool_load.py — Load test of app/connection_pool.py against a fake connector.
+
+Client threads run statements through pools of growing size on a stand-in
+for snowflake.connector whose connections execute one statement at a time
+with a fixed latency, as a Snowflake session does. Throughput should grow
+with the pool until it reaches the number of clients, where a single
+shared connection serialized every viewer's queries. A second run closes
+connections behind the pool's back and checks every one is replaced
+without a failed checkout.
+
+    python benchmarks/pool_load.py [--latency-ms 20] [--clients 16] [--queries 400]
+
+Exits non-zero if throughput does not scale or a dropped connection leaks
+an error.
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from connection_pool import connection, create_pool  # noqa: E402
+
+POOL_SIZES = [1, 2, 4, 8, 16]
+
+# Minimum speed-up per doubling of the pool while it is below the client count
+MIN_SCALING = 1.6
+
+
+class FakeConnection:
+    """snowflake.connector connection stand-in: one statement at a time, `latency_s` each."""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn: FakeConnection):
+        self.conn = conn
+
+    def execute(self, query: str):
+        if self.conn.closed:
+            raise ConnectionError("connection closed")
+        with self.conn.lock:
+            time.sleep(self.conn.latency_s)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+def run(max_size: int, clients: int, queries: int, latency_s: float, drop_rate: float = 0.0) -> dict:
+    """Run `queries` statements from `clients` threads; return throughput and pool stats."""
+    pool = create_pool(
+        lambda: FakeConnection(latency_s), max_size=max_size, validate_after_s=0 if drop_rate else 60
+    )
+    rng = random.Random(max_size)
+
+    def work(_):
+        with connection(pool) as conn:
+            conn.cursor().execute("SELECT 1")
+            if rng.random() < drop_rate:
+                conn.close()  # dropped by the server after this statement
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as ex:
+        futures = [ex.submit(work, i) for i in range(queries)]
+        errors = sum(1 for f in futures if f.exception() is not None)
+    elapsed = time.perf_counter() - start
+    return {"qps": queries / elapsed, "errors": errors, **pool["stats"]}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=400)
+    args = parser.parse_args()
+    latency_s = args.latency_ms / 1000
+
+    ok = True
+    print(f"{args.clients} clients, {args.queries} statements of {args.latency_ms:g} ms")
+    print(f"{'max_size':>8} {'q/s':>8} {'opened':>7} {'errors':>7}")
+    prev = None
+    for size in POOL_SIZES:
+        r = run(size, args.clients, args.queries, latency_s)
+        print(f"{size:>8} {r['qps']:>8.0f} {r['opened']:>7} {r['errors']:>7}")
+        if r["errors"] or (prev is not None and size <= args.clients and r["qps"] < prev * MIN_SCALING):
+            ok = False
+        prev = r["qps"]
+
+    r = run(4, args.clients, args.queries, latency_s, drop_rate=0.1)
+    print(f"10% of connections dropped: {r['reconnects']} replaced, {r['errors']} errors")
+    ok = ok and r["errors"] == 0 and r["reconnects"] > 0
+
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+restated_rows.py — Check that a restated row is counted once on every load path.
+
+A copy of the Facebook export gets its last row (the latest day, inside
+data_loader.RESTATEMENT_DAYS) appended again with a different spend, as a
+platform restating a recent day does. Every path must then
+keep only the restated version:
+
+- the root app on the pandas engine (ad rows and the streaming cube) and
+  on the DuckDB engine, each rendered warm (from the .cache built before
+  the append) and cold (.cache removed), one process per render
+- data_loader.load_batch() on the DuckDB stand-in session, cold and as an
+  incremental refresh of the frame loaded before the append, and the
+  PLATFORM_SUMMARY view it aggregates in SQL
+
+    python benchmarks/restated_rows.py [--work-dir DIR]
+
+Needs duckdb and streamlit. Exits non-zero if any total spend differs from
+the original total plus the restated difference.
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "app"))
+
+import data_loader  # noqa: E402
+from local_warehouse import local_session  # noqa: E402
+
+EXPORT = "01_facebook_ads.csv"
+SPEND_COLUMN = 7
+RESTATED_DELTA = 100.0
+
+# Name -> (engine, streaming)
+APPS = {"pandas": ("pandas", False), "pandas stream": ("pandas", True), "duckdb": ("duckdb", False)}
+
+
+def restate(data: Path) -> float:
+    """Append the export's last row with RESTATED_DELTA more spend; return the delta."""
+    path = data / EXPORT
+    last = path.read_text().splitlines()[-1].split(",")
+    last[SPEND_COLUMN] = f"{float(last[SPEND_COLUMN]) + RESTATED_DELTA:.2f}"
+    with open(path, "a") as f:
+        f.write(",".join(last) + "\n")
+    return RESTATED_DELTA
+
+
+def stage(name: str, work: Path) -> Path:
+    """A copy of the root app and data/ for APPS[name], with an empty .cache."""
+    engine, streaming = APPS[name]
+    app = work / name.replace(" ", "-")
+    for d in ("app", "sql", "data"):
+        shutil.copytree(ROOT / d, app / d, ignore=shutil.ignore_patterns("__pycache__", ".cache"))
+    src = (ROOT / "streamlit_app.py").read_text().replace('ENGINE = "pandas"', f'ENGINE = "{engine}"')
+    if streaming:
+        src = src.replace("STREAMING_MIN_BYTES = 256 * 1024 * 1024", "STREAMING_MIN_BYTES = 0")
+    (app / "streamlit_app.py").write_text(src)
+    return app
+
+
+def render(app: Path) -> float:
+    """Total spend shown by `app`'s first page, rendered in a child process."""
+    proc = subprocess.run([sys.executable, __file__, "--child", str(app)], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def child(app: Path):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(app / "streamlit_app.py"), default_timeout=600)
+    at.run()
+    if at.exception:
+        raise SystemExit(f"app raised: {at.exception[0].value}")
+    print(json.dumps(float(at.metric[0].value.strip("$").replace(",", ""))))
+
+
+def loader_spend(data: Path, cache: Path, version: str) -> tuple:
+    """
+    Rows and total spend of UNIFIED_ADS, and PLATFORM_SUMMARY's total
+    spend, through load_batch() on a stand-in session.
+    """
+    out = data_loader.load_batch(["unified", "plat_summary"], session=local_session(data, cache), version=version)
+    df = out["unified"]
+    return len(df), round(float(df["spend"].sum()), 2), round(float(out["plat_summary"]["total_spend"].sum()), 2)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--work-dir", type=Path, default=Path(tempfile.gettempdir()) / "restated_rows")
+    parser.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+    results = {}
+    for name in APPS:
+        app = stage(name, args.work_dir)
+        before = render(app)
+        expected = round(before + restate(app / "data"), 2)
+        results[f"{name}, warm"] = render(app)
+        shutil.rmtree(app / ".cache")
+        results[f"{name}, cold"] = render(app)
+
+    data, cache = args.work_dir / "loader-data", args.work_dir / "loader-cache"
+    shutil.copytree(ROOT / "data", data)
+    rows, _, _ = loader_spend(data, cache, "before")
+    restate(data)
+    warm_rows, results["load_batch, incremental"], _ = loader_spend(data, cache, "after")
+    data_loader._incremental_state()["frames"].clear()
+    cold_rows, results["load_batch, cold"], results["PLATFORM_SUMMARY view"] = loader_spend(data, cache, "after-cold")
+
+    ok = warm_rows == cold_rows == rows
+    print(f"restated row: +${RESTATED_DELTA:,.2f}, expected total ${expected:,.2f}")
+    for label, spend in results.items():
+        good = round(spend, 2) == expected
+        ok = ok and good
+        print(f"{label:<26} ${spend:>12,.2f}  {'ok' if good else 'MISMATCH'}")
+    print(f"load_batch rows: {rows} before, {warm_rows} incremental, {cold_rows} cold")
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
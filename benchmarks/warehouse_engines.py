@@ -0,0 +1,129 @@
+"""
+warehouse_engines.py — Benchmark of the local app's pandas and DuckDB engines.
+
+The data/ exports are scaled up to the requested row counts (campaigns and
+dates are spread out so the views keep growing with the rows), and the
+root streamlit_app.py is rendered once per engine and size from cold CSVs,
+then once more from its .cache as a restarted app would. Each render runs
+in its own process through Streamlit's AppTest, timing the whole first
+page and recording the process's peak RSS. A render that runs out of
+memory is reported as such.
+
+    python benchmarks/warehouse_engines.py [--rows 1000000 10000000 50000000] [--work-dir DIR]
+
+Needs duckdb (also used to generate the data) and streamlit. The pandas
+engine switches to chunked streaming by itself above STREAMING_MIN_BYTES
+of CSV, as the app does.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+EXPORTS = ["01_facebook_ads.csv", "02_google_ads.csv", "03_tiktok_ads.csv"]
+ENGINES = ["pandas", "duckdb"]
+
+# Campaigns each exported campaign is split into, and days between copies
+SPREAD_CAMPAIGNS = 50
+SPREAD_DAYS = 30
+
+
+def generate(rows: int, out: Path):
+    """Write the three exports scaled to `rows` rows in total under `out` (kept if present)."""
+    import duckdb
+
+    out.mkdir(parents=True, exist_ok=True)
+    if all((out / f).exists() for f in EXPORTS):
+        return
+    con = duckdb.connect()
+    for f in EXPORTS:
+        src = (ROOT / "data" / f).as_posix()
+        n = con.execute(f"SELECT COUNT(*) FROM read_csv('{src}')").fetchone()[0]
+        copies = -(-rows // len(EXPORTS) // n)
+        con.execute(
+            f"COPY (SELECT * EXCLUDE (i) REPLACE ("
+            f"CAST(date + INTERVAL ((i // {SPREAD_CAMPAIGNS}) * {SPREAD_DAYS}) DAY AS DATE) AS date, "
+            f"campaign_id || '_' || (i % {SPREAD_CAMPAIGNS}) AS campaign_id, "
+            f"campaign_name || '_' || (i % {SPREAD_CAMPAIGNS}) AS campaign_name) "
+            f"FROM read_csv('{src}', header=true) CROSS JOIN range({copies}) t(i) "
+            f"LIMIT {rows // len(EXPORTS)}) TO '{(out / f).as_posix()}' (HEADER)"
+        )
+
+
+def stage(engine: str, data: Path, work: Path) -> Path:
+    """A copy of the app on `engine` reading `data`, with an empty .cache."""
+    app = work / f"app-{engine}-{data.name}"
+    shutil.rmtree(app, ignore_errors=True)
+    app.mkdir(parents=True)
+    for d in ("app", "sql"):
+        shutil.copytree(ROOT / d, app / d, ignore=shutil.ignore_patterns("__pycache__", ".cache"))
+    os.symlink(data, app / "data")
+    src = (ROOT / "streamlit_app.py").read_text()
+    (app / "streamlit_app.py").write_text(src.replace('ENGINE = "pandas"', f'ENGINE = "{engine}"'))
+    return app
+
+
+def render(app: Path) -> dict:
+    """Render `app`'s first page in a child process; wall time, peak RSS and the spend KPI."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, __file__, "--child", str(app)], capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        killed = proc.returncode in (-9, 137) or "MemoryError" in proc.stderr
+        return {"error": "out of memory" if killed else proc.stderr.strip().splitlines()[-1:]}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"seconds": elapsed, **result}
+
+
+def child(app: Path):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(app / "streamlit_app.py"), default_timeout=3600)
+    at.run()
+    if at.exception:
+        raise SystemExit(f"app raised: {at.exception[0].value}")
+    # ru_maxrss is in KiB on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(json.dumps({"peak_mb": peak_mb, "total_spend": at.metric[0].value}))
+
+
+def fmt(r: dict) -> str:
+    if "error" in r:
+        return f"{str(r['error']):>24}"
+    return f"{r['seconds']:>8.1f} s {r['peak_mb']:>7} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES)
+    parser.add_argument("--work-dir", type=Path, default=Path(tempfile.gettempdir()) / "warehouse_engines")
+    parser.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    print(f"{'rows':>11} {'engine':>7} {'cold CSVs':>20} {'restart':>20}  total spend")
+    for rows in args.rows:
+        data = args.work_dir / f"data-{rows}"
+        generate(rows, data)
+        for engine in args.engines:
+            app = stage(engine, data.resolve(), args.work_dir)
+            cold = render(app)
+            warm = render(app) if "error" not in cold else {"error": "-"}
+            print(f"{rows:>11,} {engine:>7} {fmt(cold)} {fmt(warm)}  {cold.get('total_spend', '')}")
+            shutil.rmtree(app, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
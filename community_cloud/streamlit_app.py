@@ -3,14 +3,28 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import snowflake.connector
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+from batches import fold_batches, lower_columns  # noqa: E402
+from column_manifest import select_sql  # noqa: E402
+from connection_pool import DEFAULT_MAX_SIZE, connection, create_pool  # noqa: E402
+from date_slice import sort_by_date  # noqa: E402
+from filter_index import build_index, present_values, select, selection_mask  # noqa: E402
+from frame_store import enable_copy_on_write, freeze  # noqa: E402
+from freshness import PROBE_SQL, create_probe, current_version, table_version  # noqa: E402
+from prefix_sums import build_prefix_sums, group_totals  # noqa: E402
+from schema import UNIFIED_ADS, enforce_schema, subset  # noqa: E402
 
 # ── Config ────────────────────────────────────────────────────────────────────
 st.set_page_config(page_title="Cross-Channel Ad Performance", layout="wide")
 COLORS = {"Facebook": "#1877F2", "Google": "#34A853", "TikTok": "#000000"}
+# Sessions share read-only frames; their derived frames need Copy-on-Write
+enable_copy_on_write()
 
 # ── Snowflake Connection ─────────────────────────────────────────────────────
-@st.cache_resource
-def get_snowflake_connection():
+def _connect():
     return snowflake.connector.connect(
         account=st.secrets["connections"]["snowflake"]["account"],
         user=st.secrets["connections"]["snowflake"]["user"],
@@ -19,35 +33,114 @@ def get_snowflake_connection():
         database=st.secrets["connections"]["snowflake"]["database"],
         schema=st.secrets["connections"]["snowflake"]["schema"],
         role=st.secrets["connections"]["snowflake"]["role"],
+        # Heartbeats keep idle pooled sessions from expiring
+        client_session_keep_alive=True,
     )
 
-@st.cache_data(ttl=600)
+
+@st.cache_resource
+def get_connection_pool():
+    """Process-wide pool; size from secrets `connections.snowflake.pool_max_size`."""
+    max_size = st.secrets["connections"]["snowflake"].get("pool_max_size", DEFAULT_MAX_SIZE)
+    return create_pool(_connect, max_size=int(max_size))
+
+
 def run_query(query: str) -> pd.DataFrame:
-    conn = get_snowflake_connection()
-    cur = conn.cursor()
-    cur.execute(query)
-    df = cur.fetch_pandas_all()
+    with connection(get_connection_pool()) as conn:
+        cur = conn.cursor()
+        cur.execute(query)
+        df = cur.fetch_pandas_all()
     df.columns = [c.lower() for c in df.columns]
     return df
 
 
-# ── Load Data ─────────────────────────────────────────────────────────────────
-unified = run_query("SELECT * FROM IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS")
-unified["date"] = pd.to_datetime(unified["date"])
-
-daily = run_query("SELECT * FROM IMPROVADO_ADS.ANALYTICS.DAILY_PLATFORM_SUMMARY")
-daily["date"] = pd.to_datetime(daily["date"])
-
-camp_perf = run_query("SELECT * FROM IMPROVADO_ADS.ANALYTICS.CAMPAIGN_PERFORMANCE")
+@st.cache_resource
+def freshness_probe():
+    """
+    Process-wide probe of the RAW tables' LAST_ALTERED/row counts, re-read at
+    most every 30 s on a background thread. A change is swapped in only once
+    every query has been rerun for it, so no rerun waits on the warehouse.
+    """
+    return create_probe(
+        lambda: table_version(run_query(PROBE_SQL)), on_change=lambda old, new: fetch_all(new), background=True
+    )
 
-plat_summary = run_query("SELECT * FROM IMPROVADO_ADS.ANALYTICS.PLATFORM_SUMMARY")
 
-weekly = run_query("SELECT * FROM IMPROVADO_ADS.ANALYTICS.WEEKLY_TRENDS")
-weekly["week_start"] = pd.to_datetime(weekly["week_start"])
+# The ANALYTICS views read whole, by column_manifest dataset name
+VIEWS = {
+    "daily": "DAILY_PLATFORM_SUMMARY",
+    "camp_perf": "CAMPAIGN_PERFORMANCE",
+    "plat_summary": "PLATFORM_SUMMARY",
+    "weekly": "WEEKLY_TRENDS",
+    "tt_funnel": "TIKTOK_VIDEO_FUNNEL",
+    "gq": "GOOGLE_QUALITY_ANALYSIS",
+}
+
+
+def iter_query(query: str):
+    """
+    Yield the result of `query` as Arrow tables with lower-case columns, one
+    per result chunk, as Snowflake streams them. For callers that process
+    incrementally; nothing is cached.
+    """
+    with connection(get_connection_pool()) as conn:
+        cur = conn.cursor()
+        cur.execute(query)
+        for table in cur.fetch_arrow_batches():
+            yield lower_columns(table)
+
+
+def run_query_sums(query: str, by: tuple, sums: tuple) -> pd.DataFrame:
+    """Stream `query` and fold it into sums of `sums` per `by` batch by batch."""
+    return fold_batches(iter_query(query), by, sums).to_pandas()
+
+
+# Entries for the served version and the one being refreshed in
+@st.cache_resource(max_entries=2)
+def fetch_all(version: str) -> dict:
+    """
+    Every dataset the dashboard reads, for the RAW tables' `version`, by
+    name, with the prefix sums and row-id indexes built from them. Loaded
+    once per version and shared read-only by every session.
+    """
+    # UNIFIED_ADS is only ever filtered by date/platform/campaign and summed, so
+    # it is streamed and folded to that grain instead of downloaded row by row
+    unified = run_query_sums(
+        select_sql("IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS", "unified"),
+        by=("date", "platform", "campaign_name"),
+        sums=("impressions", "clicks", "spend", "conversions"),
+    )
+    data = {"unified": sort_by_date(enforce_schema(unified, subset(UNIFIED_ADS, unified.columns)))}
+    for name, view in VIEWS.items():
+        data[name] = run_query(select_sql(f"IMPROVADO_ADS.ANALYTICS.{view}", name))
+    data["daily"]["date"] = pd.to_datetime(data["daily"]["date"])
+    data["daily"] = sort_by_date(data["daily"])
+    data["weekly"]["week_start"] = pd.to_datetime(data["weekly"]["week_start"])
+    # Cumulative daily sums per campaign for date-range totals, and per-value
+    # row-id indexes for the sidebar filters
+    data["unified_sums"] = build_prefix_sums(
+        data["unified"], ["platform", "campaign_name"], ["impressions", "clicks", "spend", "conversions"]
+    )
+    data["index"] = {
+        "unified_keys": build_index(data["unified_sums"]["keys"]),
+        **{name: build_index(data[name]) for name in ("daily", "camp_perf", "plat_summary", "weekly")},
+    }
+    return freeze(data)
 
-tt_funnel = run_query("SELECT * FROM IMPROVADO_ADS.ANALYTICS.TIKTOK_VIDEO_FUNNEL")
 
-gq = run_query("SELECT * FROM IMPROVADO_ADS.ANALYTICS.GOOGLE_QUALITY_ANALYSIS")
+# ── Load Data ─────────────────────────────────────────────────────────────────
+# Each query selects only the columns the dashboard reads (app/column_manifest.py).
+# Results are refetched only when a load changed the RAW tables (app/freshness.py).
+data = fetch_all(current_version(freshness_probe()))
+unified = data["unified"]
+daily = data["daily"]
+camp_perf = data["camp_perf"]
+plat_summary = data["plat_summary"]
+weekly = data["weekly"]
+tt_funnel = data["tt_funnel"]
+gq = data["gq"]
+unified_sums = data["unified_sums"]
+index = data["index"]
 
 # ── Header ────────────────────────────────────────────────────────────────────
 st.title("Cross-Channel Advertising Performance")
@@ -60,44 +153,35 @@ with st.sidebar:
     date_range = st.date_input(
         "Date Range", value=(min_d, max_d), min_value=min_d, max_value=max_d
     )
-    all_plat = sorted(unified["platform"].unique())
+    camp_index = index["unified_keys"]
+    all_plat = sorted(present_values(camp_index, "platform"))
     platforms = st.multiselect("Platform", options=all_plat, default=all_plat)
     avail_camps = sorted(
-        unified[unified["platform"].isin(platforms)]["campaign_name"].unique()
+        present_values(camp_index, "campaign_name", selection_mask(camp_index, {"platform": platforms}))
     )
     campaigns = st.multiselect("Campaign", options=avail_camps, default=avail_camps)
 
 # ── Apply Filters ─────────────────────────────────────────────────────────────
-if len(date_range) == 2:
-    mask = (
-        (unified["date"].dt.date >= date_range[0])
-        & (unified["date"].dt.date <= date_range[1])
-        & (unified["platform"].isin(platforms))
-        & (unified["campaign_name"].isin(campaigns))
-    )
-else:
-    mask = unified["platform"].isin(platforms) & unified["campaign_name"].isin(
-        campaigns
-    )
-
-fdf = unified[mask].copy()
-if fdf.empty:
+# KPI totals are two prefix-sum lookups per selected campaign; daily is
+# date-sorted, so its date range is a binary-searched slice, and
+# platform/campaign selections are bitmaps from per-value row-id indexes
+selected = {"platform": platforms, "campaign_name": campaigns}
+by_platform = {"platform": platforms}
+# Platform totals carry over from the previous rerun in session state: a
+# sidebar tweak only adds or subtracts the campaigns it added or removed
+plat_agg = group_totals(
+    st.session_state.setdefault("plat_totals", {}), unified_sums, date_range, selection_mask(camp_index, selected)
+)
+if plat_agg.empty:
     st.warning("No data for selected filters.")
     st.stop()
 
-daily_f = daily[daily["platform"].isin(platforms)].copy()
-if len(date_range) == 2:
-    daily_f = daily_f[
-        (daily_f["date"].dt.date >= date_range[0])
-        & (daily_f["date"].dt.date <= date_range[1])
-    ]
+daily_f = select(daily, index["daily"], by_platform, date_range)
 
-camp_f = camp_perf[
-    (camp_perf["platform"].isin(platforms))
-    & (camp_perf["campaign_name"].isin(campaigns))
-].copy()
-plat_f = plat_summary[plat_summary["platform"].isin(platforms)].copy()
-weekly_f = weekly[weekly["platform"].isin(platforms)].copy()
+# Views or masked selections of the shared frames, not copies
+camp_f = select(camp_perf, index["camp_perf"], selected)
+plat_f = select(plat_summary, index["plat_summary"], by_platform)
+weekly_f = select(weekly, index["weekly"], by_platform)
 
 # ══════════════════════════════════════════════════════════════════════════════
 # TABS
@@ -108,10 +192,10 @@ tab1, tab2, tab3, tab4 = st.tabs(
 
 # ── TAB 1: EXECUTIVE OVERVIEW ─────────────────────────────────────────────────
 with tab1:
-    total_spend = float(fdf["spend"].sum())
-    total_imp = int(fdf["impressions"].sum())
-    total_clicks = int(fdf["clicks"].sum())
-    total_conv = int(fdf["conversions"].sum())
+    total_spend = float(plat_agg["total_spend"].sum())
+    total_imp = int(plat_agg["total_impressions"].sum())
+    total_clicks = int(plat_agg["total_clicks"].sum())
+    total_conv = int(plat_agg["total_conversions"].sum())
     avg_cpa = total_spend / total_conv if total_conv else 0
     avg_ctr = total_clicks / total_imp if total_imp else 0
     avg_cpc = total_spend / total_clicks if total_clicks else 0
@@ -149,10 +233,6 @@ with tab1:
     st.plotly_chart(fig, use_container_width=True)
 
     # Donut + Conversions bar
-    plat_agg = fdf.groupby("platform", as_index=False).agg(
-        total_spend=("spend", "sum"), total_conversions=("conversions", "sum")
-    )
-
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Spend Distribution")
@@ -220,7 +300,7 @@ with tab2:
                 "spend_share",
                 "conversion_share",
             ]
-        ].copy()
+        ]
         disp.columns = [
             "Platform",
             "Campaigns",
@@ -451,7 +531,7 @@ with tab3:
                 "spend_rank",
                 "cpa_rank",
             ]
-        ].copy()
+        ]
         disp.columns = [
             "Platform",
             "Campaign",
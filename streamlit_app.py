@@ -2,195 +2,303 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import functools
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent / "app"))
+from columnar_cache import cache_key, cached_frame, source_fingerprint  # noqa: E402
+from data_loader import load_batch, use_disk_tier  # noqa: E402
+from date_slice import sort_by_date  # noqa: E402
+from filter_index import build_index, present_values, select, selection_mask  # noqa: E402
+from frame_store import content_key, derive, enable_copy_on_write, fetch, load  # noqa: E402
+from freshness import create_probe, current_version, files_version  # noqa: E402
+from incremental import UNIFIED_KEYS, dedupe, upsert  # noqa: E402
+from ingest import (  # noqa: E402
+    CUBE_KEYS, CUBE_METRICS, concat_unified, read_platform_tail, read_platforms, stream_cube, stream_groupby,
+)
+from kpis import add_kpis  # noqa: E402
+from local_warehouse import SCRIPTS, SQL_DIR, local_session  # noqa: E402
+from prefix_sums import build_prefix_sums, group_totals  # noqa: E402
+from result_cache import cached, create_cache  # noqa: E402
+from rollup import CHANGE_SUFFIX, base_cube, lag_change, period_start, rollup  # noqa: E402
+from schema import UNIFIED_ADS, enforce_schema, schema_version, subset  # noqa: E402
+
 # ── Config ────────────────────────────────────────────────────────────────────
 st.set_page_config(page_title="Cross-Channel Ad Performance", layout="wide")
 COLORS = {"Facebook": "#1877F2", "Google": "#34A853", "TikTok": "#000000"}
+# Sessions share read-only frames; their derived frames need Copy-on-Write
+enable_copy_on_write()
 
 # ── Load & Unify Data from CSVs (replicates Snowflake ANALYTICS views) ───────
 DATA_DIR = Path(__file__).parent / "data"
+CACHE_DIR = Path(__file__).parent / ".cache"
+SOURCES = {
+    "Facebook": DATA_DIR / "01_facebook_ads.csv",
+    "Google": DATA_DIR / "02_google_ads.csv",
+    "TikTok": DATA_DIR / "03_tiktok_ads.csv",
+}
+SOURCE_FILES = list(SOURCES.values())
+
+# Above this total CSV size, ingest in chunks into a (date, platform, campaign)
+# cube instead of holding every ad-group row in memory
+STREAMING_MIN_BYTES = 256 * 1024 * 1024
+STREAMING = sum(p.stat().st_size for p in SOURCE_FILES) >= STREAMING_MIN_BYTES
+
+# "pandas" rebuilds the ANALYTICS views below from the CSVs; "duckdb" runs
+# sql/*.sql on an embedded DuckDB warehouse (app/local_warehouse.py) and loads
+# the views through the same data_loader path as the SiS app
+ENGINE = "pandas"
+
+
+def _build_unified():
+    # One adapter per platform (app/ingest.py), read concurrently; platform-
+    # specific metrics not in a file are typed nulls, like NULL::<type> in SQL.
+    # A row restated later in an export replaces the earlier one, as it does
+    # when _update_unified upserts it, so cold and warm loads agree.
+    return dedupe(read_platforms(SOURCES), UNIFIED_KEYS)
+
+
+def _update_unified(previous, appended):
+    # Exports that only grew: parse just the appended bytes and upsert them on
+    # (platform, date, campaign_id, ad_group_id), so restated days replace
+    # their earlier rows. The byte offset is the CSV's high watermark.
+    by_name = {path.name: platform for platform, path in SOURCES.items()}
+    delta = concat_unified(
+        [read_platform_tail(SOURCES[by_name[n]], by_name[n], offset) for n, offset in appended.items()]
+    )
+    return upsert(previous, delta, UNIFIED_KEYS)
+
+
+def _build_cube():
+    cube, _ = stream_cube(SOURCES)
+    return cube
 
 
-@st.cache_data
 def load_unified():
-    # Facebook
-    fb = pd.read_csv(DATA_DIR / "01_facebook_ads.csv", parse_dates=["date"])
-    fb = fb.rename(columns={"ad_set_id": "ad_group_id", "ad_set_name": "ad_group_name"})
-    fb["platform"] = "Facebook"
-    fb = fb.rename(columns={"spend": "spend"})
-    fb["conversion_value"] = None
-    fb["quality_score"] = None
-    fb["search_impression_share"] = None
-    fb["video_watch_25"] = None
-    fb["video_watch_50"] = None
-    fb["video_watch_75"] = None
-    fb["video_watch_100"] = None
-    fb["likes"] = None
-    fb["shares"] = None
-    fb["comments"] = None
-
-    # Google
-    gg = pd.read_csv(DATA_DIR / "02_google_ads.csv", parse_dates=["date"])
-    gg["platform"] = "Google"
-    gg = gg.rename(columns={"cost": "spend"})
-    gg["video_views"] = None
-    gg["engagement_rate"] = None
-    gg["reach"] = None
-    gg["frequency"] = None
-    gg["video_watch_25"] = None
-    gg["video_watch_50"] = None
-    gg["video_watch_75"] = None
-    gg["video_watch_100"] = None
-    gg["likes"] = None
-    gg["shares"] = None
-    gg["comments"] = None
-    gg = gg.drop(columns=["ctr", "avg_cpc"], errors="ignore")
-
-    # TikTok
-    tt = pd.read_csv(DATA_DIR / "03_tiktok_ads.csv", parse_dates=["date"])
-    tt = tt.rename(columns={
-        "adgroup_id": "ad_group_id", "adgroup_name": "ad_group_name", "cost": "spend",
-    })
-    tt["platform"] = "TikTok"
-    tt["engagement_rate"] = None
-    tt["reach"] = None
-    tt["frequency"] = None
-    tt["conversion_value"] = None
-    tt["quality_score"] = None
-    tt["search_impression_share"] = None
-
-    # Standardize columns
-    common_cols = [
-        "platform", "date", "campaign_id", "campaign_name", "ad_group_id", "ad_group_name",
-        "impressions", "clicks", "spend", "conversions",
-        "video_views", "engagement_rate", "reach", "frequency",
-        "conversion_value", "quality_score", "search_impression_share",
-        "video_watch_25", "video_watch_50", "video_watch_75", "video_watch_100",
-        "likes", "shares", "comments",
-    ]
-    unified = pd.concat([fb[common_cols], gg[common_cols], tt[common_cols]], ignore_index=True)
-
-    # Compute KPIs (matches SQL view)
-    unified["ctr"] = (unified["clicks"] / unified["impressions"].replace(0, pd.NA)).round(4)
-    unified["cpc"] = (unified["spend"] / unified["clicks"].replace(0, pd.NA)).round(2)
-    unified["cpa"] = (unified["spend"] / unified["conversions"].replace(0, pd.NA)).round(2)
-    unified["conversion_rate"] = (unified["conversions"] / unified["clicks"].replace(0, pd.NA)).round(4)
-    unified["cpm"] = ((unified["spend"] / unified["impressions"].replace(0, pd.NA)) * 1000).round(2)
-    return unified
-
-
-@st.cache_data
-def build_daily(unified):
-    g = unified.groupby(["date", "platform"], as_index=False).agg(
-        total_impressions=("impressions", "sum"),
-        total_clicks=("clicks", "sum"),
-        total_spend=("spend", "sum"),
-        total_conversions=("conversions", "sum"),
-        total_video_views=("video_views", "sum"),
+    # Served from the Arrow cache in .cache/ unless a source CSV changed;
+    # appended rows are merged into the cached frame instead of a full rebuild
+    return cached_frame(
+        "unified", SOURCE_FILES, _build_unified, CACHE_DIR,
+        version=schema_version(UNIFIED_ADS), update=_update_unified,
     )
-    g["avg_ctr"] = (g["total_clicks"] / g["total_impressions"].replace(0, pd.NA)).round(4)
-    g["avg_cpc"] = (g["total_spend"] / g["total_clicks"].replace(0, pd.NA)).round(2)
-    g["avg_cpa"] = (g["total_spend"] / g["total_conversions"].replace(0, pd.NA)).round(2)
-    g["avg_conversion_rate"] = (g["total_conversions"] / g["total_clicks"].replace(0, pd.NA)).round(4)
-    g["avg_cpm"] = ((g["total_spend"] / g["total_impressions"].replace(0, pd.NA)) * 1000).round(2)
-    return g.sort_values(["date", "platform"])
-
-
-@st.cache_data
-def build_campaign_perf(unified):
-    g = unified.groupby(["platform", "campaign_id", "campaign_name"], as_index=False).agg(
-        total_impressions=("impressions", "sum"),
-        total_clicks=("clicks", "sum"),
-        total_spend=("spend", "sum"),
-        total_conversions=("conversions", "sum"),
+
+
+def load_cube():
+    # Streaming mode: same columns the views need, at (date, platform, campaign)
+    # grain. Summed cells cannot absorb restated rows, so changes rebuild it.
+    return cached_frame(
+        "cube", SOURCE_FILES, _build_cube, CACHE_DIR, version=schema_version(UNIFIED_ADS)
     )
-    g["avg_ctr"] = (g["total_clicks"] / g["total_impressions"].replace(0, pd.NA)).round(4)
-    g["avg_cpc"] = (g["total_spend"] / g["total_clicks"].replace(0, pd.NA)).round(2)
-    g["avg_cpa"] = (g["total_spend"] / g["total_conversions"].replace(0, pd.NA)).round(2)
-    g["avg_conversion_rate"] = (g["total_conversions"] / g["total_clicks"].replace(0, pd.NA)).round(4)
-    g["avg_cpm"] = ((g["total_spend"] / g["total_impressions"].replace(0, pd.NA)) * 1000).round(2)
+
+
+def view_cube(token):
+    # The cube every view rolls up from, built once per dataset version. In
+    # streaming mode the loaded frame already is the campaign-day cube, and
+    # on the DuckDB engine it comes from the warehouse.
+    if ENGINE == "duckdb":
+        return fetch(token)["unified"]
+    if STREAMING:
+        return fetch(token)
+    # One scan of the ad-group rows; the views below roll up from this cube
+    return derive(token, "base_cube", lambda: base_cube(fetch(token)))
+
+
+@st.cache_resource
+def get_view_cache():
+    # Disk tier behind the shared store: built views are kept in .cache/views
+    # so a restarted app reads them back instead of rebuilding them. Files
+    # written by another version of the code are discarded
+    code = source_fingerprint(sorted((Path(__file__).parent / "app").glob("*.py")) + [Path(__file__)])
+    return create_cache(max_bytes=0, ttl_s=None, disk_dir=CACHE_DIR / "views", disk_tag=cache_key(code, "views"))
+
+
+def persisted(build):
+    # Serves build(token, ...) from get_view_cache(), keyed on the contents
+    # behind the token (the token itself changes on every restart)
+    @functools.wraps(build)
+    def wrapper(token, *args, **kwargs):
+        key = (build.__name__, args, tuple(sorted(kwargs.items())), content_key(token))
+        return cached(get_view_cache(), key, lambda: build(token, *args, **kwargs))
+    return wrapper
+
+
+# Builders take the dataset version token (app/frame_store.py) rather than
+# the frame; each view is built once per token into the shared store
+@persisted
+def build_daily(token):
+    g = rollup(view_cube(token), ["date", "platform"], prefix="total_")
+    add_kpis(g, source="total_", target="avg_")
+    return g.sort_values(["date", "platform"], ignore_index=True)
+
+
+def build_daily_cube(cube):
+    # Filter-time cube at (date, platform, campaign) grain: the sidebar and
+    # the per-campaign prefix sums behind the KPI cards and platform charts
+    # are built from it, not from ad rows. Cells are kept sorted by date so
+    # a date filter is a searchsorted slice
+    return sort_by_date(rollup(cube, CUBE_KEYS, ["impressions", "clicks", "spend", "conversions"]))
+
+
+@persisted
+def load_daily_cube(token):
+    return build_daily_cube(view_cube(token))
+
+
+@persisted
+def build_campaign_perf(token):
+    # All-time totals and global ranks per campaign, like CAMPAIGN_PERFORMANCE;
+    # the sidebar only picks which campaigns are shown
+    g = rollup(view_cube(token), ["platform", "campaign_id", "campaign_name"],
+               ["impressions", "clicks", "spend", "conversions"], prefix="total_")
+    add_kpis(g, source="total_", target="avg_")
     g["spend_rank"] = g["total_spend"].rank(ascending=False, method="min")
     g["cpa_rank"] = g["avg_cpa"].rank(ascending=True, method="min")
     return g.sort_values("total_spend", ascending=False)
 
 
-@st.cache_data
-def build_platform_summary(unified):
-    g = unified.groupby("platform", as_index=False).agg(
-        campaigns=("campaign_id", "nunique"),
-        total_impressions=("impressions", "sum"),
-        total_clicks=("clicks", "sum"),
-        total_spend=("spend", "sum"),
-        total_conversions=("conversions", "sum"),
-    )
-    g["avg_ctr"] = (g["total_clicks"] / g["total_impressions"].replace(0, pd.NA)).round(4)
-    g["avg_cpc"] = (g["total_spend"] / g["total_clicks"].replace(0, pd.NA)).round(2)
-    g["avg_cpa"] = (g["total_spend"] / g["total_conversions"].replace(0, pd.NA)).round(2)
-    g["avg_conversion_rate"] = (g["total_conversions"] / g["total_clicks"].replace(0, pd.NA)).round(4)
-    g["avg_cpm"] = ((g["total_spend"] / g["total_impressions"].replace(0, pd.NA)) * 1000).round(2)
+@persisted
+def build_platform_summary(token):
+    cube = view_cube(token)
+    g = rollup(cube, ["platform"], ["impressions", "clicks", "spend", "conversions"], prefix="total_")
+    g.insert(1, "campaigns", cube.groupby("platform", observed=True)["campaign_id"].nunique().to_numpy())
+    add_kpis(g, source="total_", target="avg_")
     g["spend_share"] = (g["total_spend"] / g["total_spend"].sum()).round(4)
     g["conversion_share"] = (g["total_conversions"] / g["total_conversions"].sum()).round(4)
     return g.sort_values("total_spend", ascending=False)
 
 
-@st.cache_data
-def build_weekly(unified):
-    u = unified.copy()
-    u["week_start"] = u["date"].dt.to_period("W").apply(lambda p: p.start_time)
-    g = u.groupby(["week_start", "platform"], as_index=False).agg(
-        impressions=("impressions", "sum"),
-        clicks=("clicks", "sum"),
-        spend=("spend", "sum"),
-        conversions=("conversions", "sum"),
-    )
-    g["ctr"] = (g["clicks"] / g["impressions"].replace(0, pd.NA)).round(4)
-    g["cpc"] = (g["spend"] / g["clicks"].replace(0, pd.NA)).round(2)
-    g["cpa"] = (g["spend"] / g["conversions"].replace(0, pd.NA)).round(2)
-    return g.sort_values(["week_start", "platform"])
-
-
-@st.cache_data
-def build_tiktok_funnel():
-    tt = pd.read_csv(DATA_DIR / "03_tiktok_ads.csv")
-    g = tt.groupby("campaign_name", as_index=False).agg(
-        total_views=("video_views", "sum"),
-        watched_25pct=("video_watch_25", "sum"),
-        watched_50pct=("video_watch_50", "sum"),
-        watched_75pct=("video_watch_75", "sum"),
-        watched_100pct=("video_watch_100", "sum"),
+@persisted
+def build_weekly(token, period="week", week_start=0):
+    # WEEKLY_TRENDS, or the same trends per month/quarter/year: periods are
+    # truncated like DATE_TRUNC and the change columns mirror its LAG()s
+    col = f"{period}_start"
+    u = view_cube(token)[["date", "platform", "impressions", "clicks", "spend", "conversions"]]
+    u = u.assign(**{col: period_start(u["date"], period, week_start)})
+    g = rollup(u, [col, "platform"], ["impressions", "clicks", "spend", "conversions"])
+    add_kpis(g, ["ctr", "cpc", "cpa"])
+    g = g.sort_values([col, "platform"], ignore_index=True)
+    return lag_change(g, ["platform"], ["spend", "conversions"], CHANGE_SUFFIX[period])
+
+
+@persisted
+def build_tiktok_funnel(token):
+    # Streamed from the TikTok CSV; the token only invalidates it on change
+    g = stream_groupby(
+        SOURCES["TikTok"], "TikTok", ["campaign_name"],
+        sums=["video_views", "video_watch_25", "video_watch_50", "video_watch_75", "video_watch_100"],
     )
+    g = g.rename(columns={
+        "video_views": "total_views",
+        "video_watch_25": "watched_25pct",
+        "video_watch_50": "watched_50pct",
+        "video_watch_75": "watched_75pct",
+        "video_watch_100": "watched_100pct",
+    })
     return g.sort_values("total_views", ascending=False)
 
 
-@st.cache_data
-def build_google_quality():
-    gg = pd.read_csv(DATA_DIR / "02_google_ads.csv")
-    g = gg.groupby(["campaign_name", "ad_group_name"], as_index=False).agg(
-        avg_quality_score=("quality_score", "mean"),
-        total_impressions=("impressions", "sum"),
-        total_clicks=("clicks", "sum"),
-        total_cost=("cost", "sum"),
-        total_conversions=("conversions", "sum"),
-        total_conversion_value=("conversion_value", "sum"),
-        avg_search_impression_share=("search_impression_share", "mean"),
+@persisted
+def build_google_quality(token):
+    g = stream_groupby(
+        SOURCES["Google"], "Google", ["campaign_name", "ad_group_name"],
+        sums=["quality_score", "impressions", "clicks", "spend", "conversions",
+              "conversion_value", "search_impression_share"],
+        counts=["quality_score", "search_impression_share"],
     )
-    g["avg_quality_score"] = g["avg_quality_score"].round(1)
-    g["avg_ctr"] = (g["total_clicks"] / g["total_impressions"].replace(0, pd.NA)).round(4)
-    g["avg_cpc"] = (g["total_cost"] / g["total_clicks"].replace(0, pd.NA)).round(2)
-    g["avg_cpa"] = (g["total_cost"] / g["total_conversions"].replace(0, pd.NA)).round(2)
-    g["roas"] = (g["total_conversion_value"] / g["total_cost"].replace(0, pd.NA)).round(2)
+    g["avg_quality_score"] = (g["quality_score"] / g["quality_score_count"]).round(1)
+    g["avg_search_impression_share"] = g["search_impression_share"] / g["search_impression_share_count"]
+    g = g.rename(columns={
+        "impressions": "total_impressions",
+        "clicks": "total_clicks",
+        "spend": "total_cost",
+        "conversions": "total_conversions",
+        "conversion_value": "total_conversion_value",
+    })[[
+        "campaign_name", "ad_group_name", "avg_quality_score", "total_impressions",
+        "total_clicks", "total_cost", "total_conversions", "total_conversion_value",
+        "avg_search_impression_share",
+    ]]
+    add_kpis(g, ["ctr", "cpc", "cpa"], source="total_", target="avg_", columns={"spend": "total_cost"})
+    add_kpis(g, ["roas"], source="total_", columns={"spend": "total_cost"})
     return g.sort_values("avg_quality_score", ascending=False)
 
 
+# The local warehouse is built from the CSVs and the SQL scripts
+WAREHOUSE_SOURCES = SOURCE_FILES + [SQL_DIR / s for s in SCRIPTS]
+
+
+@st.cache_resource(max_entries=1)
+def get_local_session(version):
+    # One session per version of the warehouse sources: a change opens the
+    # warehouse rebuilt from them instead of the one built at startup
+    return local_session(DATA_DIR, CACHE_DIR)
+
+
+@st.cache_resource
+def warehouse_version_probe():
+    # The fingerprint of the warehouse sources versions its query results
+    # (Snowflake probes the RAW tables)
+    return create_probe(files_version(WAREHOUSE_SOURCES), interval_s=0)
+
+
+def load_warehouse_cube(session):
+    # Streaming-size data on the DuckDB engine: the campaign-day cube is
+    # aggregated in the warehouse rather than downloaded row by row
+    sums = ", ".join(f"SUM({m}) AS {m}" for m in CUBE_METRICS)
+    cube = session.sql(
+        f"SELECT {', '.join(CUBE_KEYS)}, {sums} FROM IMPROVADO_ADS.ANALYTICS.UNIFIED_ADS "
+        f"GROUP BY {', '.join(CUBE_KEYS)}"
+    ).to_pandas()
+    return enforce_schema(cube, subset(UNIFIED_ADS, cube.columns))
+
+
+def load_warehouse():
+    # The ANALYTICS views in one concurrent batch, plus the unified rows (or,
+    # at streaming size, the campaign-day cube aggregated in the warehouse)
+    version = current_version(warehouse_version_probe())
+    session = get_local_session(version)
+    # Query results outlive restarts in .cache/results
+    use_disk_tier(CACHE_DIR / "results")
+    data = load_batch(["daily", "camp_perf", "plat_summary", "weekly", "tt_funnel", "gq"]
+                      + ([] if STREAMING else ["unified"]), session=session, version=version)
+    if STREAMING:
+        data["unified"] = load_warehouse_cube(session)
+    return data
+
+
 # ── Build all datasets ───────────────────────────────────────────────────────
-unified = load_unified()
-daily = build_daily(unified)
-camp_perf = build_campaign_perf(unified)
-plat_summary = build_platform_summary(unified)
-weekly = build_weekly(unified)
-tt_funnel = build_tiktok_funnel()
-gq = build_google_quality()
+# The dataset is loaded once per change of its sources into a process-wide store
+# and addressed by a version token; a rerun only stat()s the source files
+if ENGINE == "duckdb":
+    token = load("warehouse", WAREHOUSE_SOURCES, load_warehouse)
+    data = fetch(token)
+    daily = data["daily"]
+    camp_perf = data["camp_perf"]
+    plat_summary = data["plat_summary"]
+    weekly = data["weekly"]
+    tt_funnel = data["tt_funnel"]
+    gq = data["gq"]
+else:
+    token = load("cube" if STREAMING else "unified", SOURCE_FILES, load_cube if STREAMING else load_unified)
+    daily = derive(token, "daily", lambda: build_daily(token))
+    camp_perf = derive(token, "camp_perf", lambda: build_campaign_perf(token))
+    plat_summary = derive(token, "plat_summary", lambda: build_platform_summary(token))
+    weekly = derive(token, "weekly", lambda: build_weekly(token))
+    tt_funnel = derive(token, "tt_funnel", lambda: build_tiktok_funnel(token))
+    gq = derive(token, "gq", lambda: build_google_quality(token))
+
+# Filter-time structures, built once per dataset version. Every session gets
+# the same read-only objects; per rerun only filter masks are allocated
+daily_cube = derive(token, "daily_cube", lambda: load_daily_cube(token))
+cube_sums = derive(token, "cube_sums", lambda: build_prefix_sums(
+    daily_cube, ["platform", "campaign_id", "campaign_name"], ["impressions", "clicks", "spend", "conversions"]
+))
+camp_index = derive(token, "camp_index", lambda: build_index(cube_sums["keys"]))
+daily_index = derive(token, "daily_index", lambda: build_index(daily))
+camp_perf_index = derive(token, "camp_perf_index", lambda: build_index(camp_perf))
+plat_index = derive(token, "plat_index", lambda: build_index(plat_summary))
+weekly_index = derive(token, "weekly_index", lambda: build_index(weekly))
 
 # ── Header ────────────────────────────────────────────────────────────────────
 st.title("Cross-Channel Advertising Performance")
@@ -199,48 +307,36 @@ st.caption("Facebook Ads | Google Ads | TikTok Ads — Unified analytics powered
 # ── Sidebar Filters ───────────────────────────────────────────────────────────
 with st.sidebar:
     st.header("Filters")
-    min_d, max_d = unified["date"].min().date(), unified["date"].max().date()
+    min_d, max_d = daily_cube["date"].min().date(), daily_cube["date"].max().date()
     date_range = st.date_input(
         "Date Range", value=(min_d, max_d), min_value=min_d, max_value=max_d
     )
-    all_plat = sorted(unified["platform"].unique())
+    all_plat = sorted(present_values(camp_index, "platform"))
     platforms = st.multiselect("Platform", options=all_plat, default=all_plat)
     avail_camps = sorted(
-        unified[unified["platform"].isin(platforms)]["campaign_name"].unique()
+        present_values(camp_index, "campaign_name", selection_mask(camp_index, {"platform": platforms}))
     )
     campaigns = st.multiselect("Campaign", options=avail_camps, default=avail_camps)
 
 # ── Apply Filters ─────────────────────────────────────────────────────────────
-if len(date_range) == 2:
-    mask = (
-        (unified["date"].dt.date >= date_range[0])
-        & (unified["date"].dt.date <= date_range[1])
-        & (unified["platform"].isin(platforms))
-        & (unified["campaign_name"].isin(campaigns))
-    )
-else:
-    mask = unified["platform"].isin(platforms) & unified["campaign_name"].isin(
-        campaigns
-    )
-
-fdf = unified[mask].copy()
-if fdf.empty:
+# Filters select campaigns of the daily cube; each one's date-range totals
+# are two lookups in its prefix sums, and the KPI cards and platform charts
+# are summed from those, never from cube cells or ads
+camp_sel = selection_mask(camp_index, {"platform": platforms, "campaign_name": campaigns})
+# Platform totals carry over from the previous rerun in session state: a
+# sidebar tweak only adds or subtracts the campaigns it added or removed
+plat_agg = group_totals(st.session_state.setdefault("plat_totals", {}), cube_sums, date_range, camp_sel)
+if plat_agg.empty:
     st.warning("No data for selected filters.")
     st.stop()
 
-daily_f = daily[daily["platform"].isin(platforms)].copy()
-if len(date_range) == 2:
-    daily_f = daily_f[
-        (daily_f["date"].dt.date >= date_range[0])
-        & (daily_f["date"].dt.date <= date_range[1])
-    ]
+by_platform = {"platform": platforms}
+daily_f = select(daily, daily_index, by_platform, date_range)
 
-camp_f = camp_perf[
-    (camp_perf["platform"].isin(platforms))
-    & (camp_perf["campaign_name"].isin(campaigns))
-].copy()
-plat_f = plat_summary[plat_summary["platform"].isin(platforms)].copy()
-weekly_f = weekly[weekly["platform"].isin(platforms)].copy()
+# Views or masked selections of the shared frames, not copies
+camp_f = select(camp_perf, camp_perf_index, {"platform": platforms, "campaign_name": campaigns})
+plat_f = select(plat_summary, plat_index, by_platform)
+weekly_f = select(weekly, weekly_index, by_platform)
 
 # ══════════════════════════════════════════════════════════════════════════════
 # TABS
@@ -251,10 +347,10 @@ tab1, tab2, tab3, tab4 = st.tabs(
 
 # ── TAB 1: EXECUTIVE OVERVIEW ─────────────────────────────────────────────────
 with tab1:
-    total_spend = float(fdf["spend"].sum())
-    total_imp = int(fdf["impressions"].sum())
-    total_clicks = int(fdf["clicks"].sum())
-    total_conv = int(fdf["conversions"].sum())
+    total_spend = float(plat_agg["total_spend"].sum())
+    total_imp = int(plat_agg["total_impressions"].sum())
+    total_clicks = int(plat_agg["total_clicks"].sum())
+    total_conv = int(plat_agg["total_conversions"].sum())
     avg_cpa = total_spend / total_conv if total_conv else 0
     avg_ctr = total_clicks / total_imp if total_imp else 0
     avg_cpc = total_spend / total_clicks if total_clicks else 0
@@ -292,10 +388,6 @@ with tab1:
     st.plotly_chart(fig, use_container_width=True)
 
     # Donut + Conversions bar
-    plat_agg = fdf.groupby("platform", as_index=False).agg(
-        total_spend=("spend", "sum"), total_conversions=("conversions", "sum")
-    )
-
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Spend Distribution")
@@ -363,7 +455,7 @@ with tab2:
                 "spend_share",
                 "conversion_share",
             ]
-        ].copy()
+        ]
         disp.columns = [
             "Platform",
             "Campaigns",
@@ -594,7 +686,7 @@ with tab3:
                 "spend_rank",
                 "cpa_rank",
             ]
-        ].copy()
+        ]
         disp.columns = [
             "Platform",
             "Campaign",